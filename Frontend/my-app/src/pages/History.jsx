@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { FaCalendarAlt, FaBullseye, FaSyncAlt, FaTrophy, FaFilter } from 'react-icons/fa';
 
 const groupSessionsByDate = (sessions) => {
@@ -41,13 +41,31 @@ const SessionCard = ({ session }) => (
     </div>
 );
 
+const PAGE_SIZE = 20;
+const HISTORY_FIELDS = 'exercise_type,rep_count,average_accuracy,completion_timestamp';
+
 function History({ authToken }) {
     const [sessions, setSessions] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [isLoading, setIsLoading] = useState(true);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const [filter, setFilter] = useState('all'); // 'all', 'squat', 'pushup', etc.
+    const [personalBests, setPersonalBests] = useState({ mostReps: null, highestAccuracy: null });
     
     const API_BASE_URL = 'http://127.0.0.1:5000/api';
 
+    const fetchPage = useCallback(async (cursor) => {
+        // The backend filters, projects and pages; we only ask for what we show
+        const params = new URLSearchParams({ limit: PAGE_SIZE, fields: HISTORY_FIELDS });
+        if (filter !== 'all') params.set('exercise', filter);
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${API_BASE_URL}/workout?${params}`, {
+            headers: { Authorization: `Bearer ${authToken}` },
+        });
+        if (!response.ok) throw new Error("Network response was not ok");
+        return response.json();
+    }, [authToken, filter]);
+
     useEffect(() => {
         const fetchHistory = async () => {
             if (!authToken) {
@@ -55,13 +73,9 @@ function History({ authToken }) {
                 return;
             }
             try {
-                // The backend doesn't need a filter; we fetch all and filter on the client
-                const response = await fetch(`${API_BASE_URL}/workout`, {
-                    headers: { Authorization: `Bearer ${authToken}` },
-                });
-                if (!response.ok) throw new Error("Network response was not ok");
-                const data = await response.json();
-                setSessions(data);
+                const page = await fetchPage(null);
+                setSessions(page.workouts);
+                setNextCursor(page.next_cursor);
             } catch (error) {
                 console.error("Failed to fetch history:", error);
             } finally {
@@ -69,28 +83,46 @@ function History({ authToken }) {
             }
         };
         fetchHistory();
-    }, [authToken]);
+    }, [authToken, fetchPage]);
+
+    useEffect(() => {
+        // Bests cover the whole history, so they come from the server rather than the loaded pages
+        if (!authToken) return;
+        const fetchBests = async () => {
+            const params = new URLSearchParams();
+            if (filter !== 'all') params.set('exercise', filter);
+            try {
+                const response = await fetch(`${API_BASE_URL}/workout/bests?${params}`, {
+                    headers: { Authorization: `Bearer ${authToken}` },
+                });
+                if (!response.ok) throw new Error("Network response was not ok");
+                const bests = await response.json();
+                setPersonalBests({ mostReps: bests.most_reps, highestAccuracy: bests.highest_accuracy });
+            } catch (error) {
+                console.error("Failed to fetch personal bests:", error);
+            }
+        };
+        fetchBests();
+    }, [authToken, filter]);
 
-    // useMemo will re-calculate filtered sessions only when sessions or filter change
-    const filteredSessions = useMemo(() => {
-        if (filter === 'all') {
-            return sessions;
+    const loadMore = async () => {
+        setIsLoadingMore(true);
+        try {
+            const page = await fetchPage(nextCursor);
+            setSessions(prev => [...prev, ...page.workouts]);
+            setNextCursor(page.next_cursor);
+        } catch (error) {
+            console.error("Failed to fetch more history:", error);
+        } finally {
+            setIsLoadingMore(false);
         }
-        return sessions.filter(session => session.exercise_type === filter);
-    }, [sessions, filter]);
+    };
 
-    const groupedSessions = groupSessionsByDate(filteredSessions);
+    const groupedSessions = groupSessionsByDate(sessions);
     
-    const personalBests = useMemo(() => {
-        if (filteredSessions.length === 0) return { mostReps: null, highestAccuracy: null };
-        const mostReps = filteredSessions.reduce((prev, current) => (prev.rep_count > current.rep_count) ? prev : current);
-        const highestAccuracy = filteredSessions.reduce((prev, current) => (prev.average_accuracy > current.average_accuracy) ? prev : current);
-        return { mostReps, highestAccuracy };
-    }, [filteredSessions]);
-
 
     if (isLoading) return <div className="text-center p-8 text-white">Loading Workout History...</div>;
-    if (sessions.length === 0) return (
+    if (sessions.length === 0 && filter === 'all') return (
         <div>
             <h1 className="text-3xl font-semibold mb-8 text-gray-200">Workout History</h1>
             <p className="text-gray-400">You haven't saved any workouts yet. Go complete a session!</p>
@@ -119,7 +151,7 @@ function History({ authToken }) {
                 </div>
             </div>
 
-            {filteredSessions.length === 0 && filter !== 'all' && (
+            {sessions.length === 0 && filter !== 'all' && (
                  <p className="text-gray-400 text-center py-8">No history found for this exercise.</p>
             )}
 
@@ -138,6 +170,15 @@ function History({ authToken }) {
                             <div className="space-y-4">{groupedSessions.older.map(session => <SessionCard key={session._id.$oid} session={session} />)}</div>
                         </div>
                     )}
+                    {nextCursor && (
+                        <button
+                            onClick={loadMore}
+                            disabled={isLoadingMore}
+                            className="w-full bg-gray-800 hover:bg-gray-700 text-gray-300 py-3 rounded-lg transition-colors disabled:opacity-50"
+                        >
+                            {isLoadingMore ? 'Loading...' : 'Load More'}
+                        </button>
+                    )}
                 </div>
                 
                 <div className="space-y-6">
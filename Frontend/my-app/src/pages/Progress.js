@@ -2,45 +2,47 @@ import React, { useState, useEffect, useMemo } from 'react';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { FaDownload } from 'react-icons/fa';
 
+const SUMMARY_BUCKETS = 90;
+
 function Progress({ authToken }) {
-    const [sessions, setSessions] = useState([]);
+    const [buckets, setBuckets] = useState([]);
     const [isLoading, setIsLoading] = useState(true);
     const [filter, setFilter] = useState('squat');
 
     const API_BASE_URL = 'http://127.0.0.1:5000/api';
 
     useEffect(() => {
-        const fetchHistory = async () => {
+        const fetchSummary = async () => {
             if (!authToken) {
                 setIsLoading(false);
                 return;
             }
             try {
-                const response = await fetch(`${API_BASE_URL}/workout`, {
+                // The server keeps daily totals per exercise, so this is a small fixed-size query
+                const params = new URLSearchParams({ exercise: filter, period: 'day', limit: SUMMARY_BUCKETS });
+                const response = await fetch(`${API_BASE_URL}/progress/summary?${params}`, {
                     headers: { Authorization: `Bearer ${authToken}` },
                 });
                 if (!response.ok) throw new Error("Network response was not ok");
                 const data = await response.json();
-                setSessions(data);
+                setBuckets(data.buckets);
             } catch (error) {
-                console.error("Failed to fetch history for progress:", error);
+                console.error("Failed to fetch progress summary:", error);
             } finally {
                 setIsLoading(false);
             }
         };
-        fetchHistory();
-    }, [authToken]);
+        fetchSummary();
+    }, [authToken, filter]);
 
     const chartData = useMemo(() => {
-        return sessions
-            .filter(s => s.exercise_type === filter)
-            .sort((a, b) => new Date(a.completion_timestamp.$date) - new Date(b.completion_timestamp.$date))
-            .map(s => ({
-                date: new Date(s.completion_timestamp.$date).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
-                reps: s.rep_count,
-                accuracy: s.average_accuracy,
-            }));
-    }, [sessions, filter]);
+        return buckets.map(b => ({
+            // Bucket starts are UTC dates; format them in UTC so they don't shift a day
+            date: new Date(b.start).toLocaleDateString('en-US', { month: 'short', day: 'numeric', timeZone: 'UTC' }),
+            reps: b.total_reps,
+            accuracy: b.average_accuracy,
+        }));
+    }, [buckets]);
 
     const handleDownload = () => {
         if (chartData.length === 0) {
@@ -128,7 +130,7 @@ function Progress({ authToken }) {
             ) : (
                 <div className="text-center text-gray-400 bg-gray-800 rounded-lg p-16">
                     <h2 className="text-2xl font-bold text-white mb-2">Not Enough Data</h2>
-                    <p>Complete at least two '{filter.replace(/_/g, ' ')}' sessions to see your progress chart.</p>
+                    <p>Complete '{filter.replace(/_/g, ' ')}' sessions on at least two days to see your progress chart.</p>
                 </div>
             )}
         </div>
@@ -15,6 +15,9 @@ const CheckCircleIcon = () => (
     </svg>
 );
 
+// Used until the server suggests a capture interval of its own.
+const DEFAULT_CAPTURE_INTERVAL_MS = 200;
+
 function Session({ authToken }) {
   const [repCounts, setRepCounts] = useState({ good: 0, bad: 0, uncertain: 0 });
   const [feedback, setFeedback] = useState('Select an exercise and press Start.');
@@ -28,10 +31,14 @@ function Session({ authToken }) {
 
   const webcamRef = useRef(null);
   const intervalRef = useRef(null);
+  const captureIntervalRef = useRef(DEFAULT_CAPTURE_INTERVAL_MS);
+  const sessionIdRef = useRef(null);
+  const socketRef = useRef(null);
   const lastSpokenFeedback = useRef('');
   const navigate = useNavigate();
   
   const API_BASE_URL = 'http://127.0.0.1:5000/api';
+  const STREAM_URL = 'ws://127.0.0.1:5000/api/stream';
 
   const speakFeedback = (text) => {
     if ('speechSynthesis' in window && text && text !== lastSpokenFeedback.current) {
@@ -46,6 +53,11 @@ function Session({ authToken }) {
       clearInterval(intervalRef.current);
       intervalRef.current = null;
     }
+    if (socketRef.current) {
+      const socket = socketRef.current;
+      socketRef.current = null;
+      socket.close();
+    }
   }, []);
 
   const handleSaveWorkout = async () => {
@@ -57,6 +69,8 @@ function Session({ authToken }) {
       rep_count: repCounts.good,
       duration_seconds: duration_seconds,
       average_accuracy: accuracy,
+      // Links the saved workout to this set's landmark recording
+      session_id: sessionIdRef.current,
     };
 
     try {
@@ -96,45 +110,73 @@ function Session({ authToken }) {
   }, [stopAnalysis]);
 
 
-  const sendFrameForAnalysis = useCallback(async () => {
-    if (webcamRef.current && webcamRef.current.getScreenshot && authToken) {
-      const imageSrc = webcamRef.current.getScreenshot();
-      if (!imageSrc) {
-        return;
-      }
+  const handleAnalysisResult = useCallback((data) => {
+    if (data.error) {
+      console.error("Error analyzing frame:", data.error);
+      return;
+    }
 
-      try {
-        const response = await fetch(`${API_BASE_URL}/analyze`, {
-          method: 'POST',
-          headers: { 
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${authToken}`,
-          },
-          body: JSON.stringify({ image: imageSrc, exercise: selectedExercise }),
-        });
+    speakFeedback(data.feedback);
 
-        if (!response.ok) {
-          throw new Error(`Server error: ${response.status}`);
-        }
-        const data = await response.json();
+    setRepCounts({ good: data.good_reps, bad: data.bad_reps, uncertain: data.uncertain_reps });
+    setFeedback(data.feedback);
+    setAccuracy(data.accuracy);
+    
+    if (data.good_reps >= repGoal) {
+      handleStopSession(`Goal of ${repGoal} reps reached! Well done!`);
+    }
+  }, [handleStopSession, repGoal]);
 
-        speakFeedback(data.feedback);
+  const sendFrameForAnalysis = useCallback(async () => {
+    const socket = socketRef.current;
+    // Skip this tick if the previous frame is still being uploaded.
+    if (!socket || socket.readyState !== WebSocket.OPEN || socket.bufferedAmount > 0) {
+      return;
+    }
+    if (webcamRef.current && webcamRef.current.getCanvas) {
+      const canvas = webcamRef.current.getCanvas();
+      if (!canvas) {
+        return;
+      }
+      const frame = await new Promise((resolve) => canvas.toBlob(resolve, 'image/jpeg', 0.92));
+      if (frame && socket.readyState === WebSocket.OPEN) {
+        socket.send(frame);
+      }
+    }
+  }, []);
 
-        setRepCounts({ good: data.good_reps, bad: data.bad_reps, uncertain: data.uncertain_reps });
-        setFeedback(data.feedback);
-        setAccuracy(data.accuracy);
-        
-        if (data.good_reps >= repGoal) {
-          handleStopSession(`Goal of ${repGoal} reps reached! Well done!`);
-        }
+  const openAnalysisStream = () => {
+    const socket = new WebSocket(STREAM_URL);
+    socketRef.current = socket;
 
-      } catch (error) {
-        console.error("Error sending frame:", error);
-        setFeedback('Error connecting to AI server.');
-        handleStopSession('Connection to server lost.');
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ token: authToken, exercise: selectedExercise, session_id: sessionIdRef.current }));
+    };
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'ready') {
+        captureIntervalRef.current = DEFAULT_CAPTURE_INTERVAL_MS;
+        intervalRef.current = setInterval(sendFrameForAnalysis, DEFAULT_CAPTURE_INTERVAL_MS);
+        return;
       }
-    }
-  }, [selectedExercise, handleStopSession, repGoal, authToken]);
+      // The server suggests a faster capture rate mid-rep and a slower one at rest.
+      if (data.next_interval_ms && data.next_interval_ms !== captureIntervalRef.current && intervalRef.current) {
+        captureIntervalRef.current = data.next_interval_ms;
+        clearInterval(intervalRef.current);
+        intervalRef.current = setInterval(sendFrameForAnalysis, data.next_interval_ms);
+      }
+      handleAnalysisResult(data);
+    };
+    socket.onclose = (event) => {
+      // Only react to closes we did not initiate ourselves.
+      if (socketRef.current !== socket) {
+        return;
+      }
+      console.error("Analysis stream closed:", event.code, event.reason);
+      setFeedback('Error connecting to AI server.');
+      handleStopSession('Connection to server lost.');
+    };
+  };
 
   const startAnalysis = async () => {
     if (!authToken) {
@@ -146,12 +188,16 @@ function Session({ authToken }) {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${authToken}`,
-        }
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ session_id: crypto.randomUUID() }),
       });
       
       if (!response.ok) {
         throw new Error(`Server responded with status: ${response.status}`);
       }
+      const { session_id } = await response.json();
+      sessionIdRef.current = session_id;
       
       setRepCounts({ good: 0, bad: 0, uncertain: 0 });
       setAccuracy(0);
@@ -159,7 +205,7 @@ function Session({ authToken }) {
       setFeedback('Analysis started!');
       setStartTime(new Date());
 
-      intervalRef.current = setInterval(sendFrameForAnalysis, 200);
+      openAnalysisStream();
     } catch (err) {
       console.error("Error starting analysis: ", err);
       setFeedback("Could not start the analysis session.");
@@ -1,21 +1,38 @@
 from dotenv import load_dotenv
 import os
 import json
+import atexit
 import base64
-import numpy as np
-import cv2
-from io import BytesIO
-from PIL import Image
-from flask import Flask, jsonify, request
+import binascii
+import itertools
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+from flask_sock import Sock, ConnectionClosed
 from pymongo import MongoClient
-from bson import json_util
 from authlib.integrations.flask_oauth2 import ResourceProtector, current_token
 from auth import Auth0JWTBearerTokenValidator
 from datetime import datetime
+from bson import json_util
 
 # --- Import ML Logic ---
-from ml import ExerciseTracker, process_frame
+from ml import EXERCISES, analyze_landmarks, tracker_summary
+from inference import DeadlineExceeded, FrameDropped, create_inference_service
+from sessions import SessionRegistry, normalize_session_id
+from motion import motion_thumbnail
+from streaming import LatestFrameSlot
+from video import VideoJobQueue
+from coach import CoachService
+from history import HISTORY_SORT, build_history_query, ensure_history_index, get_personal_bests, stream_history
+from progress import MAX_SUMMARY_BUCKETS, PERIODS, ensure_rollup_index, get_summary
+from journal import WorkoutJournal
+from recordings import (RECORDING_ID_PATTERN, RECORDINGS_DIR, SessionRecorder, compile_overrides, list_recordings,
+                        new_recording_id, prune_recordings, recording_path, rescore)
+import metrics
+from metrics import FRAMES, stage
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -26,6 +43,10 @@ app = Flask(__name__)
 # --- CORS CONFIGURATION ---
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
 
+# --- WEBSOCKET CONFIGURATION ---
+sock = Sock(app)
+STREAM_AUTH_TIMEOUT = 10  # seconds a new stream has to send its auth message
+
 
 # --- AUTH0 CONFIGURATION ---
 validator = Auth0JWTBearerTokenValidator(
@@ -36,43 +57,255 @@ require_auth = ResourceProtector()
 require_auth.register_token_validator(validator)
 
 # --- MONGODB CONFIGURATION ---
-try:
-    mongo_client = MongoClient(os.environ.get("MONGO_URI"))
-    db = mongo_client.get_database("replicai_db")
-    users_collection = db.get_collection("users")
-    workouts_collection = db.get_collection("workouts")
-    print("✅ Successfully connected to MongoDB.")
-except Exception as e:
-    print(f"❌ Error connecting to MongoDB: {e}")
-    mongo_client = None
+# Connected by startup(), not at import: MongoClient starts monitor threads,
+# which must not be created before a forking server forks its workers.
+mongo_client = None
+users_collection = workouts_collection = rollups_collection = None
+
+def connect_mongo(client=None):
+    """Creates the MongoDB client (unless one is given) and the collection handles."""
+    global mongo_client, users_collection, workouts_collection, rollups_collection
+    try:
+        mongo_client = client if client is not None else MongoClient(os.environ.get("MONGO_URI"))
+        db = mongo_client.get_database("replicai_db")
+        users_collection = db.get_collection("users")
+        workouts_collection = db.get_collection("workouts")
+        rollups_collection = db.get_collection("progress_rollups")
+        print("✅ Successfully connected to MongoDB.")
+    except Exception as e:
+        print(f"❌ Error connecting to MongoDB: {e}")
+        mongo_client = None
+        users_collection = workouts_collection = rollups_collection = None
+
+def create_indexes():
+    """Creates the indexes the history and progress queries rely on; runs off the import path."""
+    try:
+        ensure_history_index(workouts_collection)
+        ensure_rollup_index(rollups_collection)
+        print("✅ MongoDB indexes are in place.")
+    except Exception as e:
+        print(f"❌ Error creating MongoDB indexes: {e}")
+
+# Saves are journaled to local disk and written to MongoDB in the background; created by startup().
+workout_journal = None
 
 # --- ML MODEL STATE ---
-tracker = None
+inference = create_inference_service()
+sessions = SessionRegistry(
+    max_sessions=int(os.environ.get("MAX_SESSIONS", "1024")),
+    ttl=float(os.environ.get("SESSION_TTL", "1800")),
+    on_evict=inference.release,
+)
+video_jobs = VideoJobQueue()
+coach = CoachService()
 
-# --- HELPER FUNCTIONS ---
-def parse_json(data):
-    """Custom JSON parser to handle MongoDB's ObjectId and datetime."""
-    return json.loads(json_util.dumps(data))
+# Frames of one batch request are analyzed side by side; threads start on first use.
+MAX_BATCH_FRAMES = int(os.environ.get("MAX_BATCH_FRAMES", "16"))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BATCH_WORKERS", str(os.cpu_count() or 4))),
+    thread_name_prefix="batch",
+)
 
-def get_or_create_user(auth0_id):
-    """Finds a user by their Auth0 ID ('sub') or creates a new one."""
-    if not mongo_client or not auth0_id:
-        return None
-    
-    try:
-        user_profile = users_collection.find_one_and_update(
-            {'_id': auth0_id},
-            {'$setOnInsert': {'_id': auth0_id, 'created_at': datetime.utcnow()}},
-            upsert=True,
-            return_document=True
-        )
-        if user_profile:
-            print(f"User '{auth0_id}' found or created.")
-        return user_profile
+# --- STARTUP ---
+# Importing this module opens no connections and starts no threads, so a
+# forking server can preload it; every process then calls startup() once.
+JWKS_RETRY_MAX_DELAY = 30.0
+RECORDING_PRUNE_INTERVAL = 24 * 3600
+_startup_lock = threading.Lock()
+_started = False
+
+def startup(mongo=None):
+    """Connects to MongoDB, starts the workout journal and warms up everything else in the background.
+
+    ``mongo`` replaces the client built from MONGO_URI; loadtest.py passes an in-memory one.
+    """
+    global workout_journal, _started
+    with _startup_lock:
+        if _started:
+            return
+        connect_mongo(mongo)
+        if mongo_client:
+            threading.Thread(target=create_indexes, daemon=True).start()
+        workout_journal = WorkoutJournal(workouts_collection, users_collection, rollups_collection)
+        workout_journal.start()
+        atexit.register(workout_journal.close)
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+        if RECORDINGS_DIR:
+            threading.Thread(target=prune_old_recordings, name="prune-recordings", daemon=True).start()
+        _started = True
+
+def warm_up():
+    """Loads the pose models, starts the coach and fetches the Auth0 signing keys."""
+    try:
+        seconds = inference.warmup()
+        if seconds is not None:
+            print(f"🧠 Pose model warmed up in {seconds:.2f}s.")
     except Exception as e:
-        print(f"❌ MongoDB error in get_or_create_user: {e}")
+        print(f"❌ Error warming up the pose model: {e}")
+    try:
+        coach.start()
+    except Exception as e:
+        print(f"❌ Error starting the coach: {e}")
+    delay = 1.0
+    while not validator.jwks.loaded:
+        if validator.jwks.refresh() is None:
+            time.sleep(delay)
+            delay = min(delay * 2, JWKS_RETRY_MAX_DELAY)
+
+def prune_old_recordings():
+    """Applies RECORDING_RETENTION_DAYS now and then once a day."""
+    while True:
+        removed = prune_recordings()
+        if removed:
+            print(f"🏋️  Pruned {removed} expired session recording(s).")
+        time.sleep(RECORDING_PRUNE_INTERVAL)
+
+@app.before_request
+def ensure_started():
+    # Covers `flask run` and any server that skips the explicit startup() call.
+    if not _started:
+        startup()
+
+# --- HELPER FUNCTIONS ---
+BINARY_FRAME_TYPES = {"application/octet-stream", "image/jpeg", "image/webp"}
+
+def read_frame_request():
+    """Extracts (image bytes, exercise, session id) from an analyze request.
+
+    Accepts raw JPEG/WebP bodies (with ``exercise`` and ``session_id`` in the
+    query string), multipart uploads with an ``image`` file part, and the
+    legacy JSON body carrying a base64 data URL.
+    """
+    if request.mimetype in BINARY_FRAME_TYPES:
+        return request.get_data(cache=False), request.args.get('exercise'), request.args.get('session_id')
+
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        img_bytes = upload.read() if upload else None
+        return img_bytes, request.form.get('exercise'), request.form.get('session_id')
+
+    data = request.get_json(silent=True)
+    if not data or 'image' not in data:
+        return None, None, None
+    return decode_data_url(data['image']), data.get('exercise'), data.get('session_id')
+
+def decode_data_url(value):
+    """Returns the bytes of a base64 data URL (or bare base64), or None if it is not valid."""
+    try:
+        return base64.b64decode(value.split(',')[-1])
+    except (binascii.Error, AttributeError):
         return None
 
+def read_batch_request():
+    """Extracts [(image bytes, exercise, session id), ...] from a batch analyze request.
+
+    Accepts a JSON body {"frames": [{"image", "exercise", "session_id"}, ...]}
+    with base64 data URL images, or a multipart upload whose ``frames`` field
+    is the same list as JSON with each ``image`` naming one of its file parts.
+    ``exercise_type`` is accepted in place of ``exercise``. Raises ValueError
+    if the batch itself is malformed.
+    """
+    if request.mimetype == 'multipart/form-data':
+        try:
+            frames = json.loads(request.form.get('frames') or 'null')
+        except ValueError:
+            raise ValueError("'frames' must be a JSON list") from None
+
+        def read_image(frame):
+            upload = request.files.get(str(frame.get('image')))
+            return upload.read() if upload else None
+    else:
+        frames = (request.get_json(silent=True) or {}).get('frames')
+
+        def read_image(frame):
+            return decode_data_url(frame.get('image'))
+
+    if not isinstance(frames, list) or not frames:
+        raise ValueError("'frames' must be a non-empty list")
+    if len(frames) > MAX_BATCH_FRAMES:
+        raise ValueError(f"A batch may hold at most {MAX_BATCH_FRAMES} frames")
+    if not all(isinstance(frame, dict) for frame in frames):
+        raise ValueError("Each frame must be an object")
+    return [
+        (read_image(frame), frame.get('exercise') or frame.get('exercise_type'), frame.get('session_id'))
+        for frame in frames
+    ]
+
+def capture_interval(session, exercise):
+    """Suggests the client's next capture interval: fastest mid-rep, slowest at rest."""
+    mid_rep = exercise is not None and session.tracker.stage == exercise.peak
+    return session.gate.next_interval_ms(mid_rep)
+
+def analyze_session_frame(session_key, img_bytes, exercise_type):
+    """Runs a frame through the motion gate, pose inference and the session's tracker.
+
+    Frames that barely differ from the last analyzed one skip inference and
+    return the tracker's current state flagged as motion_skipped. Frames that
+    were superseded or missed their deadline leave the tracker untouched and
+    return its current state flagged as dropped. Every result carries
+    next_interval_ms, the suggested wait before the client's next frame.
+    Raises ValueError if the image cannot be decoded.
+    """
+    # Taken before inference so queueing delays don't distort the tracker's timeline.
+    received_at = time.monotonic()
+    session = sessions.get_or_create(*session_key)
+    with stage("motion"):
+        thumbnail = motion_thumbnail(img_bytes)
+    exercise = EXERCISES.get(exercise_type)
+
+    with session.lock:
+        session.frames_received += 1
+        seq = session.frames_received
+        if session.gate.should_skip(thumbnail):
+            session.frames_applied = seq
+            FRAMES.labels("motion_skipped").inc()
+            return dict(tracker_summary(session.tracker), motion_skipped=True, next_interval_ms=capture_interval(session, exercise))
+
+    try:
+        with stage("inference"):
+            pose_landmarks = inference.detect(session_key, img_bytes, ladder=exercise.input_ladder if exercise else None)
+    except (FrameDropped, DeadlineExceeded):
+        pose_landmarks = None
+        seq = 0
+    except ValueError:
+        FRAMES.labels("invalid").inc()
+        raise
+
+    with session.lock:
+        if seq <= session.frames_applied:
+            FRAMES.labels("dropped").inc()
+            return dict(tracker_summary(session.tracker), dropped=True, next_interval_ms=capture_interval(session, exercise))
+        session.frames_applied = seq
+        session.gate.analyzed(thumbnail)
+        analysis_result = analyze_landmarks(pose_landmarks, exercise_type, session.tracker, received_at)
+        if exercise is not None and RECORDINGS_DIR and RECORDING_ID_PATTERN.match(session_key[1]):
+            if session.recorder is None:
+                session.recorder = SessionRecorder(recording_path(session_key[0], new_recording_id(session_key[1])), exercise_type)
+            if session.recorder.exercise_type == exercise_type:
+                # The smoothed landmarks, so re-scoring sees exactly what the tracker saw.
+                session.recorder.append(received_at, session.tracker.temporal.points)
+        if pose_landmarks is not None and session.tracker.is_new_rep:
+            # Never waits on the model: a cached tip shows up now, a fresh one on a later frame.
+            coach.request_tip(session.tracker, exercise_type, img_bytes)
+            analysis_result["gemini_feedback"] = session.tracker.gemini_coach_tip
+        analysis_result["next_interval_ms"] = capture_interval(session, exercise)
+        return analysis_result
+
+def analyze_batch_frame(session_key, img_bytes, exercise_type):
+    """Analyzes one frame of a batch; a failure becomes that frame's error instead of the batch's."""
+    if not img_bytes or not exercise_type:
+        result = {"error": "Missing image or exercise data"}
+    else:
+        try:
+            result = analyze_session_frame(session_key, img_bytes, exercise_type)
+        except ValueError as e:
+            result = {"error": str(e)}
+        except Exception as e:
+            print(f"❌ Error during batch frame analysis: {e}")
+            result = {"error": "Failed to analyze frame"}
+    result["session_id"] = session_key[1]
+    return result
+
 # --- API ENDPOINTS ---
 
 @app.route("/")
@@ -80,49 +313,249 @@ def home():
     """Health check endpoint."""
     return "ReplicAI API is running!"
 
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: 200 once the pose model is loaded and tokens can be verified, 503 until then.
+
+    MongoDB is reported but not required, since saves are journaled while it is down.
+    """
+    checks = {
+        "startup": _started,
+        "pose_model": inference.ready,
+        "auth_keys": validator.jwks.loaded,
+    }
+    ready = all(checks.values())
+    body = {
+        "status": "ready" if ready else "starting",
+        "checks": checks,
+        "database": mongo_client is not None,
+        "journal_pending": len(workout_journal) if workout_journal is not None else 0,
+    }
+    return jsonify(body), 200 if ready else 503
+
+@app.route("/api/metrics")
+def metrics_endpoint():
+    """Exposes hot-path counters and latency histograms in the Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/api/reset", methods=["POST"])
 @require_auth()
 def reset_tracker():
     """Resets the exercise tracker state for a new session."""
-    global tracker
-    tracker = ExerciseTracker()
+    data = request.get_json(silent=True) or {}
+    try:
+        session_id = normalize_session_id(data.get('session_id'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    sessions.reset(current_token.get('sub'), session_id)
     print("🏋️  Tracker reset for new session.")
-    return jsonify({"message": "Tracker reset"}), 200
+    return jsonify({"message": "Tracker reset", "session_id": session_id}), 200
 
 @app.route("/api/analyze", methods=["POST"])
 @require_auth()
 def analyze_frame():
     """Receives a video frame, processes it, and returns analysis."""
-    data = request.get_json()
-    if not data or 'image' not in data or 'exercise' not in data:
+    with stage("read_request"):
+        img_bytes, exercise_type, session_id = read_frame_request()
+    if not img_bytes or not exercise_type:
         return jsonify({"error": "Missing image or exercise data"}), 400
-        
-    image_data = data['image'].split(',')[1]
-    exercise_type = data['exercise']
-    
-    try:
-        img_bytes = base64.b64decode(image_data)
-        img = Image.open(BytesIO(img_bytes))
-        frame = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        analysis_result = process_frame(frame, exercise_type, tracker)
-        return jsonify(analysis_result)
+
+    try:
+        session_id = normalize_session_id(session_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session_key = (current_token.get('sub'), session_id)
+    try:
+        analysis_result = analyze_session_frame(session_key, img_bytes, exercise_type)
+        with stage("serialize"):
+            return jsonify(analysis_result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"❌ Error during frame analysis: {e}")
         return jsonify({"error": "Failed to analyze frame"}), 500
 
+@app.route("/api/analyze/batch", methods=["POST"])
+@require_auth()
+def analyze_batch():
+    """Analyzes one frame from each of several sessions, e.g. every camera at a kiosk.
+
+    Frames are decoded and run through pose inference in parallel, each on
+    its own session's warm graph (or worker). The response is
+    {"results": [...]} in request order; each result is what /api/analyze
+    returns plus its session_id, or {"session_id", "error"} if that frame failed.
+    """
+    with stage("read_request"):
+        try:
+            batch = read_batch_request()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    auth0_id = current_token.get('sub')
+    jobs = []
+    seen = set()
+    for img_bytes, exercise_type, session_id in batch:
+        try:
+            session_id = normalize_session_id(session_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if session_id in seen:
+            # A session's frames must be applied in order, so they cannot share a batch.
+            return jsonify({"error": f"Session '{session_id}' appears more than once in the batch"}), 400
+        seen.add(session_id)
+        jobs.append(((auth0_id, session_id), img_bytes, exercise_type))
+
+    if len(jobs) == 1:
+        results = [analyze_batch_frame(*jobs[0])]
+    else:
+        results = list(batch_executor.map(lambda job: analyze_batch_frame(*job), jobs))
+    with stage("serialize"):
+        return jsonify({"results": results})
+
+@sock.route("/api/stream")
+def analysis_stream(ws):
+    """Streams frame analysis over a WebSocket for one workout session.
+
+    The first message must be JSON: {"token", "exercise", "session_id"}.
+    After that, every binary message is a JPEG/WebP frame and every reply is
+    the same analysis JSON /api/analyze returns. Frames that arrive while the
+    previous one is still being analyzed replace each other, so only the
+    newest is processed.
+    """
+    try:
+        hello = json.loads(ws.receive(timeout=STREAM_AUTH_TIMEOUT) or "{}")
+        session_id = normalize_session_id(hello.get('session_id'))
+    except (ValueError, TypeError, AttributeError):
+        ws.close(reason=1008, message="Invalid handshake")
+        return
+
+    claims = validator.authenticate_token(hello.get('token') or "")
+    exercise_type = hello.get('exercise')
+    if claims is None or claims.is_expired() or not claims.get('sub'):
+        ws.close(reason=1008, message="Unauthorized")
+        return
+    if not exercise_type:
+        ws.close(reason=1008, message="Missing exercise")
+        return
+
+    session_key = (claims['sub'], session_id)
+    slot = LatestFrameSlot()
+
+    def read_frames():
+        try:
+            while True:
+                message = ws.receive()
+                if isinstance(message, (bytes, bytearray)):
+                    slot.put(message)
+        except ConnectionClosed:
+            pass
+        finally:
+            slot.close()
+
+    threading.Thread(target=read_frames, daemon=True).start()
+    ws.send(json.dumps({"type": "ready", "session_id": session_id}))
+
+    while not slot.closed:
+        img_bytes = slot.get(timeout=1.0)
+        if img_bytes is None:
+            continue
+        if claims['exp'] < time.time():
+            ws.close(reason=1008, message="Token expired")
+            break
+        try:
+            analysis_result = analyze_session_frame(session_key, img_bytes, exercise_type)
+        except ValueError as e:
+            analysis_result = {"error": str(e)}
+        except Exception as e:
+            print(f"❌ Error during stream analysis: {e}")
+            analysis_result = {"error": "Failed to analyze frame"}
+        analysis_result["dropped_frames"] = slot.dropped
+        with stage("serialize"):
+            message = json.dumps(analysis_result)
+        ws.send(message)
+
+
+@app.route("/api/video", methods=["POST"])
+@require_auth()
+def submit_video():
+    """Accepts a recorded workout video and queues it for offline scoring."""
+    upload = request.files.get('video')
+    exercise_type = request.form.get('exercise')
+    if not upload or not exercise_type:
+        return jsonify({"error": "Missing video or exercise data"}), 400
+
+    suffix = os.path.splitext(upload.filename or "")[1] or ".mp4"
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    upload.save(path)
+    job_id = video_jobs.submit(current_token.get('sub'), path, exercise_type)
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route("/api/video/<job_id>", methods=["GET"])
+@require_auth()
+def get_video_result(job_id):
+    """Reports the status, and once finished the per-rep results, of a video job."""
+    job = video_jobs.get(current_token.get('sub'), job_id)
+    if job is None:
+        return jsonify({"error": "Unknown video job"}), 404
+    return jsonify(job), 200
+
+@app.route("/api/recordings/rescore", methods=["POST"])
+@require_auth()
+def rescore_recordings():
+    """Re-scores the user's recorded sessions of one exercise with changed thresholds.
+
+    Body: {"exercise", "overrides": {"enter": [["knee", "<", 115]], ...},
+    optional "recording_ids"}. Only the recorded landmarks are replayed;
+    the pose model never runs.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    exercise_name = data.get("exercise")
+    exercise = EXERCISES.get(exercise_name) if isinstance(exercise_name, str) else None
+    if exercise is None:
+        return jsonify({"error": "Unknown or missing exercise"}), 400
+    wanted = data.get("recording_ids")
+    if wanted is not None and not isinstance(wanted, list):
+        return jsonify({"error": "'recording_ids' must be a list"}), 400
+    try:
+        exercise = compile_overrides(exercise, data.get("overrides"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    recordings = list_recordings(current_token.get('sub'), exercise.name)
+    if wanted is not None:
+        wanted = set(map(str, wanted))
+        recordings = [recording for recording in recordings if recording.id in wanted]
+    started = time.perf_counter()
+    results = rescore(recordings, exercise, include_reps=bool(data.get("include_reps")))
+    return jsonify({
+        "exercise": exercise.name,
+        "recordings": results,
+        "processing_seconds": round(time.perf_counter() - started, 3),
+    }), 200
+
 
 @app.route("/api/workout", methods=["POST"], endpoint="save_workout")
 @require_auth()
 def save_workout_route():
-    """Saves a completed workout session to the database."""
-    if not mongo_client:
-        return jsonify({"error": "Database connection failed"}), 500
-        
+    """Saves a completed workout session.
+
+    The workout is journaled to local disk and acknowledged right away; it
+    reaches MongoDB with the next background flush, so saves keep working
+    while the database is slow or down.
+    """
     auth0_id = current_token.get('sub')
     if not auth0_id:
         return jsonify({"error": "Unauthorized"}), 401
-    
-    get_or_create_user(auth0_id)
 
     try:
         workout_data = request.json
@@ -134,7 +567,14 @@ def save_workout_route():
             "average_accuracy": workout_data.get("average_accuracy", 0),
             "completion_timestamp": datetime.utcnow(),
         }
-        workouts_collection.insert_one(new_workout)
+        session_id = workout_data.get("session_id")
+        if RECORDINGS_DIR and session_id:
+            # The set is over: closing the session writes out the rest of its recording.
+            session = sessions.discard(auth0_id, str(session_id))
+            recorder = session.recorder if session is not None else None
+            if recorder is not None and os.path.exists(recorder.path):
+                new_workout["recording_id"] = recorder.id
+        workout_journal.append(new_workout)
         print(f"✅ Workout saved for user {auth0_id}")
         return jsonify({"message": "Workout saved successfully!"}), 201
     except Exception as e:
@@ -144,7 +584,13 @@ def save_workout_route():
 @app.route("/api/workout", methods=["GET"], endpoint="get_workout_history")
 @require_auth()
 def get_workout_history_route():
-    """Retrieves all workout sessions for the authenticated user."""
+    """Retrieves the authenticated user's workout sessions, newest first.
+
+    Without ``limit`` the response is the full JSON array. With ``limit`` it
+    is one page, {"workouts": [...], "next_cursor": ...}; pass the cursor
+    back to get the next page. ``exercise``, ``from``/``to`` and ``fields``
+    narrow the results.
+    """
     if not mongo_client:
         return jsonify({"error": "Database connection failed"}), 500
         
@@ -153,12 +599,74 @@ def get_workout_history_route():
         return jsonify({"error": "Unauthorized"}), 401
 
     try:
-        user_workouts = workouts_collection.find({"user_id": auth0_id}).sort("completion_timestamp", -1)
-        workout_list = list(user_workouts)
-        return parse_json(workout_list), 200
+        query, projection, limit = build_history_query(auth0_id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        with stage("db_history"):
+            user_workouts = workouts_collection.find(query, projection).sort(HISTORY_SORT)
+            if limit is not None:
+                user_workouts = user_workouts.limit(limit + 1)
+            # Pull the first document now so database errors still produce a 500.
+            first_workout = next(user_workouts, None)
     except Exception as e:
         print(f"❌ Error fetching workout history: {e}")
         return jsonify({"error": "Failed to retrieve workout history."}), 500
 
+    documents = user_workouts if first_workout is None else itertools.chain([first_workout], user_workouts)
+    return Response(stream_history(documents, limit), mimetype="application/json"), 200
+
+@app.route("/api/workout/bests", methods=["GET"])
+@require_auth()
+def get_personal_bests_route():
+    """Returns the user's most-reps and highest-accuracy workouts over their whole history.
+
+    ``exercise`` limits both to one exercise. History pages arrive a few at a
+    time, so the client cannot work these out from what it has loaded.
+    """
+    if not mongo_client:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    auth0_id = current_token.get('sub')
+    try:
+        with stage("db_history"):
+            bests = get_personal_bests(workouts_collection, auth0_id, request.args.get('exercise'))
+    except Exception as e:
+        print(f"❌ Error fetching personal bests: {e}")
+        return jsonify({"error": "Failed to retrieve personal bests."}), 500
+    return Response(json_util.dumps(bests), mimetype="application/json"), 200
+
+@app.route("/api/progress/summary", methods=["GET"])
+@require_auth()
+def get_progress_summary():
+    """Returns per-day or per-week totals for one exercise, oldest first."""
+    if not mongo_client:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    auth0_id = current_token.get('sub')
+    exercise_type = request.args.get('exercise')
+    period = request.args.get('period', 'day')
+    if not exercise_type:
+        return jsonify({"error": "Missing exercise"}), 400
+    if period not in PERIODS:
+        return jsonify({"error": f"'period' must be one of {', '.join(PERIODS)}"}), 400
+    try:
+        limit = int(request.args.get('limit', 30))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    limit = max(1, min(limit, MAX_SUMMARY_BUCKETS))
+
+    try:
+        with stage("db_progress"):
+            buckets = get_summary(rollups_collection, auth0_id, exercise_type, period, limit)
+        return jsonify({"exercise": exercise_type, "period": period, "buckets": buckets}), 200
+    except Exception as e:
+        print(f"❌ Error fetching progress summary: {e}")
+        return jsonify({"error": "Failed to retrieve progress summary."}), 500
+
 if __name__ == "__main__":
+    # Under the debug reloader only the child process that serves requests starts up.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        startup()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -1,26 +1,165 @@
 # Logic/auth.py
 
+import collections
+import hashlib
 import os
+import threading
+import time
 import requests
 from authlib.integrations.flask_oauth2 import ResourceProtector
 from authlib.oauth2.rfc7523 import JWTBearerTokenValidator
+from authlib.jose.errors import DecodeError
 from authlib.jose.jwk import JsonWebKey
+from metrics import stage
+
+# --- Auth Caching Configuration ---
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "3600"))  # seconds before the key set is re-fetched
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))  # floor between fetches
+JWKS_TIMEOUT = float(os.getenv("JWKS_TIMEOUT", "5"))
+JWKS_RETRIES = int(os.getenv("JWKS_RETRIES", "3"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+
+class JWKSCache:
+    """Keeps the tenant's signing keys in memory and re-fetches them when needed.
+
+    The key set is loaded on first use, refreshed after ``ttl`` seconds, and
+    refreshed early when a token names a ``kid`` it does not contain, so key
+    rotation works without a restart. Fetches are at least
+    ``min_refresh_interval`` apart, so tokens with made-up kids cannot hammer
+    the endpoint, and a failed fetch keeps serving the last good keys.
+
+    Instances are callable as authlib key loaders: ``(header, payload) -> key``.
+    """
+
+    def __init__(self, url, ttl=JWKS_CACHE_TTL, min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 timeout=JWKS_TIMEOUT, retries=JWKS_RETRIES):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self._key_set = None
+        self._fetched_at = 0.0
+        self._last_attempt = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """True once a key set has been fetched."""
+        return self._key_set is not None
+
+    def __call__(self, header, payload):
+        key = self.find_key(header.get("kid"))
+        if key is None:
+            raise DecodeError("Unknown signing key")
+        return key
+
+    def find_key(self, kid):
+        """Returns the key with this kid, refreshing the set once if it is missing."""
+        key_set = self._key_set
+        if key_set is None or time.monotonic() - self._fetched_at > self.ttl:
+            key_set = self.refresh()
+        key = self._lookup(key_set, kid)
+        if key is None and key_set is not None:
+            key = self._lookup(self.refresh(), kid)
+        return key
+
+    def refresh(self):
+        """Re-fetches the key set unless that happened too recently; returns the current set."""
+        # With keys in hand, only one thread refreshes and the rest keep using the old set.
+        if not self._lock.acquire(blocking=self._key_set is None):
+            return self._key_set
+        try:
+            now = time.monotonic()
+            if now - self._last_attempt < self.min_refresh_interval:
+                return self._key_set
+            self._last_attempt = now
+            key_set = self._fetch()
+            if key_set is not None:
+                self._key_set = key_set
+                self._fetched_at = time.monotonic()
+            return self._key_set
+        finally:
+            self._lock.release()
+
+    def _fetch(self):
+        for attempt in range(self.retries):
+            try:
+                response = requests.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                return JsonWebKey.import_key_set(response.json())
+            except Exception as e:
+                print(f"Failed to load public key from {self.url} (attempt {attempt + 1}/{self.retries}): {e}")
+                if attempt + 1 < self.retries:
+                    time.sleep(0.5 * 2 ** attempt)
+        return None
+
+    @staticmethod
+    def _lookup(key_set, kid):
+        if key_set is None:
+            return None
+        if kid is None:
+            return key_set.keys[0] if len(key_set.keys) == 1 else None
+        try:
+            return key_set.find_by_kid(kid)
+        except ValueError:
+            return None
+
+
+class TokenCache:
+    """A bounded LRU of validated tokens, keyed by SHA-256 and dropped once they expire."""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token_string):
+        return hashlib.sha256(token_string.encode("utf-8")).digest()
+
+    def get(self, key):
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                return None
+            if claims["exp"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, key, claims):
+        with self._lock:
+            self._entries[key] = claims
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
 
 class Auth0JWTBearerTokenValidator(JWTBearerTokenValidator):
     def __init__(self, domain, audience):
         issuer = f"https://{domain}/"
         jwks_url = f"{issuer}.well-known/jwks.json"
-        
-        try:
-            jwks = requests.get(jwks_url).json()
-            public_key = JsonWebKey.import_key_set(jwks)
-        except Exception as e:
-            print(f"Failed to load public key from {jwks_url}: {e}")
-            public_key = None
-            
-        super(Auth0JWTBearerTokenValidator, self).__init__(public_key)
+
+        # Keys are fetched on the first request rather than at import time.
+        self.jwks = JWKSCache(jwks_url)
+        self.token_cache = TokenCache()
+        super(Auth0JWTBearerTokenValidator, self).__init__(self.jwks)
         self.claims_options = {
             "exp": {"essential": True},
             "aud": {"essential": True, "value": audience},
             "iss": {"essential": True, "value": issuer},
-        }
\ No newline at end of file
+        }
+
+    def authenticate_token(self, token_string):
+        """Validates a JWT, skipping signature checks for tokens validated before."""
+        with stage("auth"):
+            key = TokenCache.key(token_string)
+            claims = self.token_cache.get(key)
+            if claims is None:
+                claims = super(Auth0JWTBearerTokenValidator, self).authenticate_token(token_string)
+                if claims is not None:
+                    self.token_cache.put(key, claims)
+            return claims
@@ -0,0 +1,334 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from motion import CAPTURE_INTERVAL_ACTIVE_MS
+
+# --- Benchmark Configuration ---
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_TOLERANCE = 0.25  # a stage regresses if its median is this much slower than the baseline
+FRAME_SIZE = (640, 480)
+RULES_FPS = 1000.0 / CAPTURE_INTERVAL_ACTIVE_MS  # rule benchmarks replay reps at the live mid-rep capture rate
+
+# (rest angle, peak angle) of the joint that drives each synthetic exercise.
+_SYNTHETIC_RANGES = {
+    "squat": (172.0, 85.0),
+    "lunge": (172.0, 85.0),
+    "bicep_curl": (170.0, 25.0),
+    "pushup": (172.0, 70.0),
+    "jumping_jack": (0.08, 0.40),
+}
+
+
+# --- Synthetic Landmark Sequences ---
+def _bend(joint, length, angle_deg, reference=(0.0, 1.0)):
+    """Places a point ``length`` away from ``joint`` at ``angle_deg`` from the reference direction."""
+    theta = np.radians(angle_deg)
+    rx, ry = reference
+    direction = (rx * np.cos(theta) - ry * np.sin(theta), rx * np.sin(theta) + ry * np.cos(theta))
+    return joint[0] + length * direction[0], joint[1] + length * direction[1]
+
+
+def _standing_pose():
+    """A front-facing standing skeleton in normalized image coordinates."""
+    from exercises import LANDMARK_INDEX as L
+
+    points = np.zeros((33, 4), dtype=np.float32)
+    points[:, 3] = 0.97
+    points[:11, :2] = (0.5, 0.15)
+    for side, dx in (("LEFT", 0.06), ("RIGHT", -0.06)):
+        points[L[f"{side}_SHOULDER"], :2] = (0.5 + dx, 0.30)
+        points[L[f"{side}_ELBOW"], :2] = (0.5 + dx * 1.3, 0.42)
+        points[L[f"{side}_WRIST"], :2] = (0.5 + dx * 1.4, 0.54)
+        for name in ("PINKY", "INDEX", "THUMB"):
+            points[L[f"{side}_{name}"], :2] = (0.5 + dx * 1.4, 0.56)
+        points[L[f"{side}_HIP"], :2] = (0.5 + dx * 0.7, 0.55)
+        points[L[f"{side}_KNEE"], :2] = (0.5 + dx * 0.7, 0.72)
+        points[L[f"{side}_ANKLE"], :2] = (0.5 + dx * 0.7, 0.90)
+        points[L[f"{side}_HEEL"], :2] = (0.5 + dx * 0.7, 0.92)
+        points[L[f"{side}_FOOT_INDEX"], :2] = (0.5 + dx * 0.9, 0.93)
+    return points
+
+
+def _pose_at(exercise_type, value, good_form):
+    """Builds one frame of ``exercise_type`` with its driving joint at ``value``."""
+    from exercises import LANDMARK_INDEX as L
+
+    points = _standing_pose()
+    for side in ("LEFT", "RIGHT"):
+        hip, knee, ankle = L[f"{side}_HIP"], L[f"{side}_KNEE"], L[f"{side}_ANKLE"]
+        shoulder, elbow, wrist = L[f"{side}_SHOULDER"], L[f"{side}_ELBOW"], L[f"{side}_WRIST"]
+        if exercise_type in ("squat", "lunge"):
+            # Shank stays vertical; the thigh rotates so the knee angle equals ``value``.
+            points[hip, :2] = _bend(points[knee, :2], 0.17, value)
+            lean = 0.0 if good_form else 60.0
+            points[shoulder, :2] = _bend(points[hip, :2], 0.25, 180.0 + lean)
+        elif exercise_type == "bicep_curl":
+            points[wrist, :2] = _bend(points[elbow, :2], 0.12, 180.0 - value)
+            points[shoulder, :2] = (points[elbow, 0], points[elbow, 1] - 0.12)
+        elif exercise_type == "pushup":
+            points[shoulder, :2] = (points[shoulder, 0], 0.40)
+            points[elbow, :2] = (points[shoulder, 0], 0.52)
+            points[wrist, :2] = _bend(points[elbow, :2], 0.12, value, reference=(0.0, -1.0))
+            points[hip, 1] = 0.42 if good_form else 0.38
+        elif exercise_type == "jumping_jack":
+            sign = 1.0 if side == "LEFT" else -1.0
+            points[ankle, 0] = 0.5 + sign * value / 2
+            arms_up = value > 0.25 and good_form
+            points[wrist, 1] = 0.20 if arms_up else 0.54
+    return points
+
+
+def synthetic_sequence(exercise_type, frames=900, fps=30.0, rep_seconds=2.0, noise=0.002, seed=0):
+    """Generates (timestamps, landmarks) for ``frames`` frames of clean, repeating reps.
+
+    Every third rep is performed with bad form so every branch of the state
+    machine is exercised.
+    """
+    if exercise_type not in _SYNTHETIC_RANGES:
+        raise ValueError(f"No synthetic generator for '{exercise_type}'")
+    rest, peak = _SYNTHETIC_RANGES[exercise_type]
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(frames, dtype=np.float64) / fps
+    phase = (timestamps / rep_seconds) % 1.0
+    values = rest + (peak - rest) * (1 - np.cos(2 * np.pi * phase)) / 2
+    rep_numbers = (timestamps // rep_seconds).astype(int)
+    points = np.stack([_pose_at(exercise_type, value, rep % 3 != 2) for value, rep in zip(values, rep_numbers)])
+    points[..., :2] += rng.normal(0.0, noise, size=points[..., :2].shape).astype(np.float32)
+    return timestamps, points
+
+
+# --- Fixture Frames ---
+_SKIN = (140, 170, 220)
+_SHIRT = (60, 60, 160)
+_PANTS = (90, 60, 40)
+
+
+def render_fixture_frames(exercise_type="squat", count=30, size=FRAME_SIZE, quality=90):
+    """Renders JPEG frames of a clothed cartoon figure doing ``exercise_type``.
+
+    A bare stick figure is not recognised as a person, which would leave
+    pose inference timing only its no-detection early exit; a filled torso,
+    limbs and a face are enough for MediaPipe to track the figure.
+    """
+    from exercises import LANDMARK_INDEX as L
+
+    width, height = size
+    _, points = synthetic_sequence(exercise_type, frames=count, fps=count / 2.0)
+    rng = np.random.default_rng(1)
+    frames = []
+    for pose in points:
+        def px(name):
+            return int(pose[L[name], 0] * width), int(pose[L[name], 1] * height)
+
+        image = cv2.add(np.full((height, width, 3), (200, 210, 220), np.uint8),
+                        rng.integers(0, 12, size=(height, width, 3), dtype=np.uint8))
+        for side in ("LEFT", "RIGHT"):
+            cv2.line(image, px(f"{side}_HIP"), px(f"{side}_KNEE"), _PANTS, 30)
+            cv2.line(image, px(f"{side}_KNEE"), px(f"{side}_ANKLE"), _PANTS, 26)
+        torso = np.array([px("LEFT_SHOULDER"), px("RIGHT_SHOULDER"), px("RIGHT_HIP"), px("LEFT_HIP")], np.int32)
+        cv2.fillConvexPoly(image, torso, _SHIRT)
+        for side in ("LEFT", "RIGHT"):
+            cv2.line(image, px(f"{side}_SHOULDER"), px(f"{side}_ELBOW"), _SHIRT, 24)
+            cv2.line(image, px(f"{side}_ELBOW"), px(f"{side}_WRIST"), _SKIN, 20)
+
+        left, right = np.array(px("LEFT_SHOULDER")), np.array(px("RIGHT_SHOULDER"))
+        neck = (left + right) // 2
+        shoulders = int(np.linalg.norm(left - right))
+        head = (int(neck[0]), int(neck[1] - shoulders * 0.9))
+        r = max(12, int(shoulders * 0.45))
+        cv2.line(image, (int(neck[0]), int(neck[1])), head, _SKIN, max(8, r // 2))
+        cv2.ellipse(image, head, (int(r * 0.8), r), 0, 0, 360, _SKIN, -1)
+        cv2.ellipse(image, (head[0], head[1] - int(r * 0.6)), (int(r * 0.85), int(r * 0.5)), 0, 180, 360, (30, 30, 30), -1)
+        for dx in (-1, 1):
+            eye = (head[0] + dx * int(r * 0.35), head[1] - int(r * 0.05))
+            cv2.circle(image, eye, max(2, r // 7), (255, 255, 255), -1)
+            cv2.circle(image, eye, max(1, r // 11), (20, 20, 20), -1)
+        cv2.ellipse(image, (head[0], head[1] + int(r * 0.5)), (max(3, r // 4), max(1, r // 10)), 0, 0, 180, (60, 60, 150), 2)
+        frames.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return frames
+
+
+def load_fixture_frames(directory):
+    """Loads every .jpg/.jpeg/.webp file in a directory as encoded bytes."""
+    paths = sorted(
+        path for pattern in ("*.jpg", "*.jpeg", "*.webp")
+        for path in glob.glob(os.path.join(directory, pattern))
+    )
+    if not paths:
+        raise ValueError(f"No JPEG/WebP frames found in '{directory}'")
+    frames = []
+    for path in paths:
+        with open(path, "rb") as f:
+            frames.append(f.read())
+    return frames
+
+
+def load_recorded_sequences(paths):
+    """Loads session recordings (see recordings.py) as (exercise, timestamps, frames) triples.
+
+    Frames with nobody in them are stored as NaN and come back as None,
+    just as analyze_landmarks receives them live.
+    """
+    from recordings import Recording
+
+    sequences = []
+    for path in paths:
+        recording = Recording(path)
+        points = np.asarray(recording.points, dtype=np.float32)
+        frames = [None if np.isnan(frame[0, 0]) else frame for frame in points]
+        sequences.append((recording.exercise_type, np.asarray(recording.timestamps), frames))
+    return sequences
+
+
+# --- Measurement ---
+def _measure(fn, items, iterations, warmup=3):
+    """Times ``fn(item)`` over ``items`` repeatedly and returns per-call latencies in microseconds."""
+    for item in items[:warmup]:
+        fn(item)
+    samples = []
+    for _ in range(iterations):
+        for item in items:
+            start = time.perf_counter_ns()
+            fn(item)
+            samples.append((time.perf_counter_ns() - start) / 1000.0)
+    return samples
+
+
+def _rules_replay(exercise_type, tracker, timestamps, frames):
+    """Returns (fn, items) for _measure that feed ``frames`` to analyze_landmarks like a live session.
+
+    _measure repeats its items, and a timestamp that does not move forward
+    restarts the session's temporal filter, so every pass continues one
+    frame interval after the previous one instead of replaying the same clock.
+    """
+    import ml
+
+    elapsed = np.asarray(timestamps, dtype=np.float64) - timestamps[0]
+    interval = float(np.median(np.diff(elapsed))) if len(elapsed) > 1 else 1.0 / RULES_FPS
+    clock = {"offset": 0.0, "last": -np.inf}
+
+    def step(index):
+        timestamp = clock["offset"] + elapsed[index]
+        if timestamp <= clock["last"]:
+            clock["offset"] = clock["last"] + interval - elapsed[index]
+            timestamp = clock["last"] + interval
+        clock["last"] = timestamp
+        return ml.analyze_landmarks(frames[index], exercise_type, tracker, timestamp)
+
+    return step, list(range(len(frames)))
+
+
+def _summarize(samples):
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "calls": len(ordered),
+        "mean_us": round(statistics.fmean(ordered), 2),
+        "p50_us": round(median, 2),
+        "p95_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "fps": round(1e6 / median, 1) if median else None,
+    }
+
+
+def run_benchmarks(frames, exercises=None, iterations=5, include_pose=True, recorded=()):
+    """Runs every hot-path stage and returns {stage: summary}.
+
+    ``recorded`` holds (exercise, timestamps, frames) sequences from
+    load_recorded_sequences, timed as rules.<exercise>.recorded.<n>.
+    """
+    import ml
+
+    exercises = exercises or sorted(ml.EXERCISES)
+    results = {}
+
+    decoded = [ml.decode_frame(frame) for frame in frames]
+    results["decode"] = _summarize(_measure(ml.decode_frame, frames, iterations))
+
+    if include_pose:
+        pool = ml.PosePool(max_size=1, spares=0)
+        detected = [pool.detect("bench", image) is not None for image in decoded]
+        results["pose_inference"] = _summarize(_measure(lambda image: pool.detect("bench", image), decoded, max(1, iterations // 5)))
+        results["pose_inference"]["detection_rate"] = round(sum(detected) / len(detected), 3)
+        pool.close()
+        if not any(detected):
+            print("WARNING: No person was detected in any frame; pose_inference only measures the empty-frame path.")
+
+    summary = None
+    for exercise_type in exercises:
+        timestamps, points = synthetic_sequence(exercise_type, frames=300, fps=RULES_FPS)
+        tracker = ml.ExerciseTracker()
+        results[f"rules.{exercise_type}"] = _summarize(_measure(*_rules_replay(exercise_type, tracker, timestamps, points), iterations))
+        summary = ml.tracker_summary(tracker)
+
+    for index, (exercise_type, timestamps, points) in enumerate(recorded):
+        tracker = ml.ExerciseTracker()
+        results[f"rules.{exercise_type}.recorded.{index}"] = _summarize(_measure(*_rules_replay(exercise_type, tracker, timestamps, points), iterations))
+
+    batch = synthetic_sequence("squat", frames=1000)[1]
+    squat = ml.EXERCISES["squat"]
+    results["rules.batch_evaluate_per_frame"] = _summarize(
+        [sample / len(batch) for sample in _measure(squat.evaluate, [batch], iterations)]
+    )
+    results["json_serialization"] = _summarize(_measure(json.dumps, [summary] * 100, iterations))
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns a list of (stage, baseline p50, current p50) that regressed beyond ``tolerance``."""
+    regressions = []
+    for stage, current in results.items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous and current["p50_us"] > previous["p50_us"] * (1 + tolerance):
+            regressions.append((stage, previous["p50_us"], current["p50_us"]))
+    return regressions
+
+
+def _print_table(results):
+    print(f"{'stage':<32}{'calls':>8}{'mean us':>12}{'p50 us':>12}{'p95 us':>12}{'fps':>12}")
+    for stage, row in results.items():
+        print(f"{stage:<32}{row['calls']:>8}{row['mean_us']:>12}{row['p50_us']:>12}{row['p95_us']:>12}{row['fps']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the frame-analysis hot path (no camera or network needed).")
+    parser.add_argument("--frames", help="directory of recorded JPEG/WebP frames (default: rendered fixtures)")
+    parser.add_argument("--landmarks", nargs="+", default=[], help="session recordings (.rec) to replay through the rules")
+    parser.add_argument("--exercise", action="append", help="limit rule benchmarks to these exercises")
+    parser.add_argument("--iterations", type=int, default=5, help="passes over the inputs per stage")
+    parser.add_argument("--skip-pose", action="store_true", help="skip the MediaPipe inference stage")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write results as the new baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="fail if any stage is slower than this baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before a stage counts as regressed")
+    args = parser.parse_args()
+
+    frames = load_fixture_frames(args.frames) if args.frames else render_fixture_frames()
+    recorded = load_recorded_sequences(args.landmarks)
+    results = run_benchmarks(frames, args.exercise, args.iterations, include_pose=not args.skip_pose, recorded=recorded)
+    _print_table(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "stages": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for stage, before, after in regressions:
+            print(f"REGRESSION {stage}: p50 {before}us -> {after}us")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import collections
+import os
+import queue
+import threading
+import time
+
+from dotenv import load_dotenv
+from metrics import counter, stage
+
+# --- Coaching Configuration ---
+load_dotenv()
+COACH_PROVIDER = os.getenv("COACH_PROVIDER", "auto")  # "gemini", "stub" or "auto" (Gemini when a key is set)
+COACH_WORKERS = int(os.getenv("COACH_WORKERS", "2"))
+COACH_QUEUE_SIZE = int(os.getenv("COACH_QUEUE_SIZE", "64"))
+COACH_COOLDOWN = float(os.getenv("COACH_COOLDOWN", "10"))  # seconds between tip requests per session
+COACH_CACHE_TTL = float(os.getenv("COACH_CACHE_TTL", "600"))
+COACH_CACHE_SIZE = int(os.getenv("COACH_CACHE_SIZE", "256"))
+
+COACH_REQUESTS = counter("replicai_coach_requests_total", "Coaching tip requests, by outcome.", ["outcome"])
+
+
+# --- Providers ---
+def build_prompt(exercise_type, form_issue, stage_name, feedback):
+    """Builds the coaching prompt sent to a model provider."""
+    exercise = exercise_type.replace("_", " ")
+    issue = f"The main form issue detected is: {form_issue}." if form_issue else "No specific form issue was detected."
+    return (
+        f"You are a concise personal trainer. The user is doing {exercise} and is currently in the "
+        f"'{stage_name or 'start'}' position. The latest rep feedback was '{feedback}'. {issue} "
+        "Give one short, encouraging coaching tip (max 15 words)."
+    )
+
+
+class GeminiProvider:
+    """Asks a Gemini model for a tip, attaching the frame when one is available."""
+
+    def __init__(self, api_key, model_name="gemini-pro-vision"):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, image_bytes=None):
+        parts = [prompt]
+        if image_bytes:
+            parts.append({"mime_type": "image/jpeg", "data": image_bytes})
+        response = self.model.generate_content(parts, stream=False)
+        response.resolve()
+        return response.text
+
+
+class StubProvider:
+    """Offline provider with canned tips, for development and tests."""
+
+    TIPS = {
+        "Keep Chest Up!": "Brace your core and keep your chest proud as you descend.",
+    }
+    DEFAULT_TIP = "Control the movement and keep a steady tempo."
+
+    def generate(self, prompt, image_bytes=None):
+        for issue, tip in self.TIPS.items():
+            if issue in prompt:
+                return tip
+        return self.DEFAULT_TIP
+
+
+def create_provider(name=COACH_PROVIDER):
+    """Builds the configured provider; "auto" falls back to the stub without a Gemini key."""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if name == "stub" or (name == "auto" and not api_key):
+        if name == "auto":
+            print("WARNING: GEMINI_API_KEY not found. Using offline coaching tips.")
+        return StubProvider()
+    if name in ("gemini", "auto"):
+        return GeminiProvider(api_key)
+    raise ValueError(f"Unknown coach provider '{name}'")
+
+
+# --- Tip Cache ---
+class TipCache:
+    """A bounded LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size=COACH_CACHE_SIZE, ttl=COACH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, tip = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return tip
+
+    def put(self, key, tip):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tip)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- Coaching Service ---
+class CoachService:
+    """Fetches coaching tips in the background so model calls never block a frame.
+
+    ``request_tip`` returns immediately. Tips are cached per
+    (exercise, form_issue, stage); on a miss, one job per key is queued for
+    the worker threads and every tracker asking for that key while it runs
+    gets the same answer. Each tracker is rate-limited by a cooldown, and
+    requests are dropped when the queue is full.
+    """
+
+    def __init__(self, provider=None, workers=COACH_WORKERS, max_queue=COACH_QUEUE_SIZE,
+                 cooldown=COACH_COOLDOWN, cache=None):
+        self.provider = provider
+        self.num_workers = workers
+        self.cooldown = cooldown
+        self.cache = cache if cache is not None else TipCache()
+        self._jobs = queue.Queue(maxsize=max_queue)
+        self._waiting = {}  # cache key -> trackers waiting on the in-flight job
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Starts the worker threads (and builds the provider if none was given)."""
+        with self._lock:
+            if self._threads:
+                return
+            if self.provider is None:
+                self.provider = create_provider()
+            for index in range(self.num_workers):
+                thread = threading.Thread(target=self._work, name=f"coach-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def request_tip(self, tracker, exercise_type, image_bytes=None):
+        """Asks for a tip matching the tracker's current state without waiting for it."""
+        key = (exercise_type, tracker.form_issue, tracker.stage)
+        cached = self.cache.get(key)
+        if cached is not None:
+            tracker.gemini_coach_tip = cached
+            COACH_REQUESTS.labels("cache_hit").inc()
+            return
+
+        now = time.time()
+        if tracker.gemini_processing or now - tracker.last_gemini_call_time < self.cooldown:
+            COACH_REQUESTS.labels("cooldown").inc()
+            return
+        if not self._threads:
+            self.start()
+
+        with self._lock:
+            waiters = self._waiting.get(key)
+            if waiters is not None:
+                waiters.append(tracker)
+                outcome = "deduplicated"
+            else:
+                prompt = build_prompt(exercise_type, tracker.form_issue, tracker.stage, tracker.feedback)
+                try:
+                    self._jobs.put_nowait((key, prompt, image_bytes))
+                except queue.Full:
+                    COACH_REQUESTS.labels("queue_full").inc()
+                    return
+                self._waiting[key] = [tracker]
+                outcome = "queued"
+            tracker.gemini_processing = True
+            tracker.last_gemini_call_time = now
+        COACH_REQUESTS.labels(outcome).inc()
+
+    def _work(self):
+        while True:
+            key, prompt, image_bytes = self._jobs.get()
+            tip = None
+            try:
+                with stage("coach"):
+                    tip = (self.provider.generate(prompt, image_bytes) or "").strip()
+            except Exception as e:
+                print(f"Error with coaching provider: {e}")
+            if tip:
+                self.cache.put(key, tip)
+            with self._lock:
+                trackers = self._waiting.pop(key, [])
+            for tracker in trackers:
+                tracker.gemini_coach_tip = tip or "Focus on your form."
+                tracker.gemini_processing = False
@@ -0,0 +1,316 @@
+import json
+import os
+
+import numpy as np
+
+# --- Exercise Definitions ---
+EXERCISES_FILE = os.getenv("EXERCISES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exercises.json"))
+
+# MediaPipe Pose landmark order, so specs can name joints without importing mediapipe.
+LANDMARK_NAMES = (
+    "NOSE", "LEFT_EYE_INNER", "LEFT_EYE", "LEFT_EYE_OUTER", "RIGHT_EYE_INNER",
+    "RIGHT_EYE", "RIGHT_EYE_OUTER", "LEFT_EAR", "RIGHT_EAR", "MOUTH_LEFT",
+    "MOUTH_RIGHT", "LEFT_SHOULDER", "RIGHT_SHOULDER", "LEFT_ELBOW", "RIGHT_ELBOW",
+    "LEFT_WRIST", "RIGHT_WRIST", "LEFT_PINKY", "RIGHT_PINKY", "LEFT_INDEX",
+    "RIGHT_INDEX", "LEFT_THUMB", "RIGHT_THUMB", "LEFT_HIP", "RIGHT_HIP",
+    "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE", "LEFT_HEEL",
+    "RIGHT_HEEL", "LEFT_FOOT_INDEX", "RIGHT_FOOT_INDEX",
+)
+LANDMARK_INDEX = {name: index for index, name in enumerate(LANDMARK_NAMES)}
+# Longest side, in pixels, of the pose input at each quality rung, fastest first.
+DEFAULT_INPUT_LADDER = (256, 384, 512)
+
+
+# --- Vectorized Geometry Kernels ---
+def joint_angles(points, triples):
+    """Computes the angle in degrees at b for every (a, b, c) index triple.
+
+    ``points`` is a (..., 33, 4) landmark array, so one call covers a single
+    frame or a whole (N, 33, 4) batch; the result has shape (..., len(triples)).
+    """
+    a = points[..., triples[:, 0], :2]
+    b = points[..., triples[:, 1], :2]
+    c = points[..., triples[:, 2], :2]
+    radians = np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0]) - np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0])
+    angle = np.abs(radians * (180.0 / np.pi))
+    return np.where(angle > 180.0, 360.0 - angle, angle)
+
+
+def min_visibility(points, indices):
+    """Returns the lowest visibility among the given landmarks, per frame."""
+    return points[..., indices, 3].min(axis=-1)
+
+
+# --- Table-driven State Machine ---
+# Tracker stages are encoded as START (no rep yet), REST and PEAK.
+START, REST, PEAK = 0, 1, 2
+# Actions looked up from (state, entered, exited).
+NOTHING, ENTER, HOLD, COMPLETE = 0, 1, 2, 3
+# Condition groups evaluated for every frame.
+ENTER_GROUP, EXIT_GROUP, FORM_GROUP = 0, 1, 2
+_GROUPS = ("enter", "exit", "form")
+_OPERATORS = ("<", ">")
+_RESETTABLE = ("form", "confidence")
+
+
+def _landmark(name, exercise):
+    try:
+        return LANDMARK_INDEX[name]
+    except KeyError:
+        raise ValueError(f"{exercise}: unknown landmark '{name}'") from None
+
+
+class CompiledExercise:
+    """An exercise spec compiled into index arrays and a transition table.
+
+    ``evaluate`` computes features, condition groups, the displayed angle and
+    the visibility confidence for one frame or a whole batch in a handful of
+    NumPy operations; ``step`` then advances a tracker by one frame with a
+    single table lookup.
+    """
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec
+        features = spec["features"]
+        columns = {}
+        angles, dx, dy = [], [], []
+        for feature, definition in features.items():
+            (kind, joints), = definition.items()
+            indices = [_landmark(joint, name) for joint in joints]
+            if kind == "angle" and len(indices) == 3:
+                angles.append((feature, indices))
+            elif kind in ("dx", "dy") and len(indices) == 2:
+                (dx if kind == "dx" else dy).append((feature, indices))
+            else:
+                raise ValueError(f"{name}: invalid feature '{feature}'")
+        # Feature columns are laid out as [angles | dx | dy].
+        for feature, _ in angles + dx + dy:
+            columns[feature] = len(columns)
+        self.feature_names = tuple(columns)
+        self.angle_triples = np.array([indices for _, indices in angles], dtype=np.intp).reshape(-1, 3)
+        self.dx_pairs = np.array([indices for _, indices in dx], dtype=np.intp).reshape(-1, 2)
+        self.dy_pairs = np.array([indices for _, indices in dy], dtype=np.intp).reshape(-1, 2)
+
+        # Conditions are stored sorted by group so each group is one contiguous slice.
+        cond_columns, cond_less, cond_values, self.group_slices = [], [], [], []
+        for group in _GROUPS:
+            start = len(cond_columns)
+            for feature, op, value in spec.get(group, []):
+                if feature not in columns or op not in _OPERATORS:
+                    raise ValueError(f"{name}: invalid {group} condition {feature} {op} {value}")
+                cond_columns.append(columns[feature])
+                cond_less.append(op == "<")
+                cond_values.append(value)
+            self.group_slices.append(slice(start, len(cond_columns)))
+        self.cond_columns = np.array(cond_columns, dtype=np.intp)
+        self.cond_less = np.array(cond_less, dtype=bool)
+        self.cond_values = np.array(cond_values, dtype=np.float32)
+
+        self.display_columns = np.array([columns[feature] for feature in spec.get("display", [])], dtype=np.intp)
+        self.key_landmarks = np.array([_landmark(joint, name) for joint in spec["key_landmarks"]], dtype=np.intp)
+
+        self.peak = spec["stages"]["peak"]
+        self.rest = spec["stages"]["rest"]
+        self.stage_codes = {None: START, self.rest: REST, self.peak: PEAK}
+        self.confidence_threshold = float(spec["confidence_threshold"])
+        resets = spec.get("reset_after_rep", [])
+        if any(item not in _RESETTABLE for item in resets):
+            raise ValueError(f"{name}: reset_after_rep may only contain {_RESETTABLE}")
+        self.reset_form = "form" in resets
+        self.reset_confidence = "confidence" in resets
+        self.feedback = spec["feedback"]
+        self.form_issue = self.feedback.get("form_issue")
+        self.input_ladder = tuple(sorted(spec.get("input_ladder", DEFAULT_INPUT_LADDER)))
+        if not self.input_ladder or any(size < 64 for size in self.input_ladder):
+            raise ValueError(f"{name}: input_ladder sizes must be at least 64 pixels")
+
+        # actions[state][entered][exited]: entering wins, then holding, then completing.
+        hold = bool(spec.get("sample_while_held", False))
+        self.actions = tuple(
+            tuple(
+                tuple(
+                    ENTER if entered and state != PEAK
+                    else HOLD if entered and hold
+                    else COMPLETE if exited and state == PEAK
+                    else NOTHING
+                    for exited in (False, True)
+                )
+                for entered in (False, True)
+            )
+            for state in (START, REST, PEAK)
+        )
+
+    def features(self, points):
+        """Returns the (..., F) feature matrix for one frame or a batch of frames."""
+        parts = []
+        if len(self.angle_triples):
+            parts.append(joint_angles(points, self.angle_triples))
+        if len(self.dx_pairs):
+            parts.append(np.abs(points[..., self.dx_pairs[:, 0], 0] - points[..., self.dx_pairs[:, 1], 0]))
+        if len(self.dy_pairs):
+            parts.append(points[..., self.dy_pairs[:, 0], 1] - points[..., self.dy_pairs[:, 1], 1])
+        return np.concatenate(parts, axis=-1)
+
+    def conditions(self, features):
+        """Evaluates the enter/exit/form groups, returning a (..., 3) boolean array."""
+        values = features[..., self.cond_columns]
+        passed = np.where(self.cond_less, values < self.cond_values, values > self.cond_values)
+        return np.stack([passed[..., group].all(axis=-1) for group in self.group_slices], axis=-1)
+
+    def display_angle(self, features):
+        """Returns the angle shown to the user, or None if the exercise has none."""
+        if not len(self.display_columns):
+            return None
+        return features[..., self.display_columns].mean(axis=-1)
+
+    def evaluate(self, points):
+        """Computes (flags, display angle, confidence) for one frame or a batch."""
+        features = self.features(points)
+        return self.conditions(features), self.display_angle(features), min_visibility(points, self.key_landmarks)
+
+    def step(self, tracker, flags, angle, confidence):
+        """Advances the tracker by one frame of evaluated flags."""
+        entered, exited, form_ok = bool(flags[ENTER_GROUP]), bool(flags[EXIT_GROUP]), bool(flags[FORM_GROUP])
+        if angle is not None:
+            tracker.angle = float(angle)
+        tracker.is_new_rep = False
+
+        state = self.stage_codes.get(tracker.stage, START)
+        action = self.actions[state][entered][exited]
+        if action == ENTER:
+            tracker.stage = self.peak
+            tracker.feedback = self.feedback["enter"]
+            self._sample(tracker, form_ok, confidence)
+        elif action == HOLD:
+            self._sample(tracker, form_ok, confidence)
+        elif action == COMPLETE:
+            self._complete(tracker)
+        return action
+
+    def run(self, tracker, points):
+        """Feeds an (N, 33, 4) batch through the tracker and returns the action per frame."""
+        flags, angles, confidence = self.evaluate(points)
+        actions = np.empty(len(points), dtype=np.int8)
+        for i in range(len(points)):
+            actions[i] = self.step(tracker, flags[i], None if angles is None else angles[i], confidence[i])
+        return actions
+
+    def _sample(self, tracker, form_ok, confidence):
+        tracker.last_rep_form_ok = form_ok
+        tracker.last_rep_confidence = float(confidence)
+        if self.form_issue is not None:
+            tracker.form_issue = None if form_ok else self.form_issue
+
+    def _complete(self, tracker):
+        tracker.is_new_rep = True
+        tracker.stage = self.rest
+
+        if tracker.last_rep_confidence < self.confidence_threshold:
+            tracker.uncertain_reps += 1
+            tracker.feedback = self.feedback["uncertain"]
+        elif tracker.last_rep_form_ok:
+            tracker.good_reps += 1
+            tracker.feedback = self.feedback["good"]
+        else:
+            tracker.bad_reps += 1
+            issue = tracker.form_issue if self.form_issue is not None else None
+            tracker.feedback = issue if issue else self.feedback["bad"]
+
+        if self.reset_form:
+            tracker.last_rep_form_ok = False
+        if self.reset_confidence:
+            tracker.last_rep_confidence = 1.0
+
+
+class RepScorer:
+    """Replays landmark timelines through an exercise and records every completed rep.
+
+    Timelines can be fed in consecutive chunks, so arbitrarily long
+    recordings are scored in bounded memory. Frames whose landmarks are NaN
+    (nobody detected) are skipped.
+    """
+
+    def __init__(self, exercise, tracker):
+        self.exercise = exercise
+        self.tracker = tracker
+        self.reps = []
+        self.frames = 0
+        self._rep_start = None
+
+    def feed(self, timestamps, points):
+        """Scores one chunk of (N,) timestamps and (N, 33, 4) landmarks."""
+        valid = ~np.isnan(points[:, 0, 0])
+        self.frames += int(valid.sum())
+        if not valid.any():
+            return
+        exercise = self.exercise
+        timestamps = timestamps[valid]
+        flags, angles, confidence = exercise.evaluate(points[valid])
+
+        tracker = self.tracker
+        for i in self._decisive(flags):
+            counts = (tracker.good_reps, tracker.bad_reps, tracker.uncertain_reps)
+            action = exercise.step(tracker, flags[i], None if angles is None else angles[i], confidence[i])
+            if action == ENTER:
+                self._rep_start = float(timestamps[i])
+            elif action == COMPLETE:
+                if tracker.good_reps > counts[0]:
+                    result = "good"
+                elif tracker.bad_reps > counts[1]:
+                    result = "bad"
+                else:
+                    result = "uncertain"
+                self.reps.append({
+                    "rep": len(self.reps) + 1,
+                    "start": self._rep_start,
+                    "end": float(timestamps[i]),
+                    "result": result,
+                    "feedback": tracker.feedback,
+                })
+        if angles is not None:
+            tracker.angle = float(angles[-1])
+
+    def _decisive(self, flags):
+        """Returns the indices of the samples that can change the tracker, in order.
+
+        Samples meeting neither the enter nor the exit conditions never do.
+        In a run of exit-only samples only the first can complete a rep, and
+        in a run of enter-only samples only the first can start one; when
+        samples are taken while held, the last of the run also matters
+        because it overwrites the form and confidence the rep is judged on.
+        """
+        code = flags[:, ENTER_GROUP] + 2 * flags[:, EXIT_GROUP].astype(np.int8)
+        first = np.ones(len(code), dtype=bool)
+        first[1:] = code[1:] != code[:-1]
+        keep = first | (code == 3)
+        if self.exercise.actions[PEAK][True][False] == HOLD:
+            last = np.ones(len(code), dtype=bool)
+            last[:-1] = code[:-1] != code[1:]
+            keep |= last & (code == 1)
+        return np.flatnonzero(keep & (code != 0))
+
+    def summary(self):
+        """Returns the rep counts, accuracy and per-rep records scored so far."""
+        tracker = self.tracker
+        judged = tracker.good_reps + tracker.bad_reps
+        return {
+            "exercise": self.exercise.name,
+            "frames_scored": self.frames,
+            "good_reps": tracker.good_reps,
+            "bad_reps": tracker.bad_reps,
+            "uncertain_reps": tracker.uncertain_reps,
+            "accuracy": round(tracker.good_reps / judged * 100, 1) if judged else 0,
+            "reps": self.reps,
+        }
+
+
+def compile_exercises(specs):
+    """Compiles a {name: spec} mapping into {name: CompiledExercise}."""
+    return {name: CompiledExercise(name, spec) for name, spec in specs.items()}
+
+
+def load_exercises(path=EXERCISES_FILE):
+    """Loads and compiles the exercise definitions file."""
+    with open(path, encoding="utf-8") as f:
+        return compile_exercises(json.load(f))
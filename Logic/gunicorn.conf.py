@@ -0,0 +1,34 @@
+"""Gunicorn settings for running the API with several worker processes.
+
+    cd Logic
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master and forked, so workers share its
+memory; each worker then connects to MongoDB and warms its own pose models
+in ``post_fork``. Live sessions and video jobs are held per worker, so with
+WEB_CONCURRENCY > 1 put a load balancer with sticky sessions in front.
+"""
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Threads, not async workers: each WebSocket stream holds one for its lifetime.
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+preload_app = True
+
+if workers > 1:
+    # Each web worker runs its own pose workers; pinning them would stack every worker on the same cores.
+    os.environ.setdefault("INFERENCE_PIN_CORES", "0")
+
+
+def on_starting(server):
+    # The app imports MediaPipe lazily; importing it here means workers inherit it instead of each paying for it.
+    from ml import pose_solution
+    pose_solution()
+
+
+def post_fork(server, worker):
+    from app import startup
+    startup()
@@ -0,0 +1,133 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId, json_util
+from bson.errors import InvalidId
+
+# --- Workout History Queries ---
+HISTORY_FIELDS = ("exercise_type", "rep_count", "duration_seconds", "average_accuracy", "completion_timestamp")
+MAX_PAGE_SIZE = 100
+HISTORY_SORT = [("completion_timestamp", -1), ("_id", -1)]
+HISTORY_INDEX = [("user_id", 1), ("completion_timestamp", -1), ("_id", -1)]
+_EPOCH = datetime(1970, 1, 1)
+PERSONAL_BESTS = {"most_reps": "rep_count", "highest_accuracy": "average_accuracy"}
+
+
+def ensure_history_index(collection):
+    """Creates the index that serves every history page (filter on user, newest first)."""
+    collection.create_index(HISTORY_INDEX, name="user_history")
+
+
+def encode_cursor(document):
+    """Builds the opaque cursor pointing just past ``document`` in history order."""
+    millis = (document["completion_timestamp"] - _EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{document['_id']}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (completion_timestamp, _id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        millis, object_id = raw.split(":")
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(object_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId):
+        raise ValueError("Invalid cursor") from None
+
+
+def _parse_date(value, name):
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' date; use ISO 8601") from None
+    # Timestamps are stored as naive UTC.
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def build_history_query(user_id, args):
+    """Turns request arguments into (filter, projection, limit) for a history query.
+
+    Supported arguments: ``exercise``, ``from`` (inclusive) and ``to``
+    (exclusive) ISO dates, ``fields`` (comma-separated), ``limit`` and
+    ``cursor``. ``limit`` is None when the client did not ask for paging.
+    Raises ValueError on invalid arguments.
+    """
+    query = {"user_id": user_id}
+    if args.get("exercise"):
+        query["exercise_type"] = args["exercise"]
+
+    date_range = {}
+    if args.get("from"):
+        date_range["$gte"] = _parse_date(args["from"], "from")
+    if args.get("to"):
+        date_range["$lt"] = _parse_date(args["to"], "to")
+    if date_range:
+        query["completion_timestamp"] = date_range
+
+    if args.get("cursor"):
+        timestamp, object_id = decode_cursor(args["cursor"])
+        query["$or"] = [
+            {"completion_timestamp": {"$lt": timestamp}},
+            {"completion_timestamp": timestamp, "_id": {"$lt": object_id}},
+        ]
+
+    projection = {"user_id": 0}
+    if args.get("fields"):
+        fields = [field.strip() for field in args["fields"].split(",") if field.strip()]
+        unknown = [field for field in fields if field not in HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # The timestamp and _id are always returned; paging depends on them.
+        projection = dict.fromkeys(set(fields) | {"completion_timestamp"}, 1)
+
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("'limit' must be an integer") from None
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return query, projection, limit
+
+
+def stream_history(cursor, limit=None):
+    """Serializes a history cursor as JSON, one document at a time.
+
+    Without a limit this yields the plain array older clients expect. With
+    one, it yields {"workouts": [...], "next_cursor": ...}; the cursor must
+    have been opened with ``limit + 1`` so the extra document reveals whether
+    another page exists.
+    """
+    yield "[" if limit is None else '{"workouts": ['
+    last = None
+    for count, document in enumerate(cursor):
+        if limit is not None and count == limit:
+            break
+        yield ("," if count else "") + json_util.dumps(document)
+        last = document
+    else:
+        last = None  # ran out of documents, so there is no next page
+    if limit is None:
+        yield "]"
+    else:
+        next_cursor = encode_cursor(last) if last is not None else None
+        yield f'], "next_cursor": {json_util.dumps(next_cursor)}}}'
+
+
+def get_personal_bests(collection, user_id, exercise_type=None):
+    """Returns {name: workout or None} for each measure in PERSONAL_BESTS over the user's whole history.
+
+    Ties go to the earliest workout.
+    """
+    query = {"user_id": user_id}
+    if exercise_type:
+        query["exercise_type"] = exercise_type
+    projection = dict.fromkeys(HISTORY_FIELDS, 1)
+    return {
+        name: collection.find_one(query, projection, sort=[(field, -1), ("completion_timestamp", 1)])
+        for name, field in PERSONAL_BESTS.items()
+    }
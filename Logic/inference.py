@@ -0,0 +1,310 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+
+# --- Inference Configuration ---
+# 0 runs pose inference in the request thread; N > 0 starts N worker processes.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+FRAME_DEADLINE = float(os.getenv("FRAME_DEADLINE", "1.0"))  # seconds a frame may wait for a result
+# Pinning assumes this process owns every core; gunicorn.conf.py turns it off for multiple web workers.
+INFERENCE_PIN_CORES = os.getenv("INFERENCE_PIN_CORES", "1") != "0"
+WORKER_CHECK_INTERVAL = 1.0  # seconds between checks for crashed workers
+
+
+class FrameDropped(Exception):
+    """A newer frame for the same session replaced this one before it ran."""
+
+
+class DeadlineExceeded(Exception):
+    """The frame's result did not arrive before its deadline."""
+
+
+# --- Worker Process ---
+def _pin_to_core(core):
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {core})
+        except OSError as e:
+            print(f"WARNING: Could not pin inference worker to core {core}: {e}")
+
+
+def _worker_main(index, core, jobs, results):
+    """Entry point of a pose worker: decodes frames and runs its own warm PosePool."""
+    _pin_to_core(core)
+    import cv2
+    # One core per worker; let the pool, not OpenCV, provide the parallelism.
+    cv2.setNumThreads(1)
+    from ml import PosePool, decode_frame
+
+    pool = PosePool()
+    # Load the models before taking frames, then tell the parent this worker is ready.
+    pool.warmup()
+    results.put((None, "ready", index))
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        kind, job_id, session_key, payload, deadline, ladder = job
+        if kind == "release":
+            pool.release(session_key)
+            continue
+        # CLOCK_MONOTONIC is shared by every process on the host.
+        if time.monotonic() > deadline:
+            results.put((job_id, "expired", None))
+            continue
+        try:
+            image_rgb = decode_frame(payload)
+            points = pool.detect(session_key, image_rgb, ladder)
+            results.put((job_id, "ok", points))
+        except ValueError as e:
+            results.put((job_id, "invalid", str(e)))
+        except Exception as e:
+            results.put((job_id, "error", repr(e)))
+    pool.close()
+
+
+# --- Parent-side Bookkeeping ---
+class _Job:
+    __slots__ = ("id", "session_key", "payload", "deadline", "ladder", "done", "status", "result")
+
+    def __init__(self, job_id, session_key, payload, deadline, ladder=None):
+        self.id = job_id
+        self.session_key = session_key
+        self.payload = payload
+        self.deadline = deadline
+        self.ladder = ladder
+        self.done = threading.Event()
+        self.status = None
+        self.result = None
+
+    def resolve(self, status, result=None):
+        self.status = status
+        self.result = result
+        self.done.set()
+
+
+class _Lane:
+    """Per-session ordering: at most one frame in flight and one waiting behind it."""
+    __slots__ = ("in_flight", "pending")
+
+    def __init__(self):
+        self.in_flight = None
+        self.pending = None
+
+
+def _wait_for(job):
+    """Blocks until a job resolves and maps its status to a result or exception."""
+    if not job.done.wait(max(0.0, job.deadline - time.monotonic())):
+        raise DeadlineExceeded("Pose inference timed out")
+    if job.status == "ok":
+        return job.result
+    if job.status == "dropped":
+        raise FrameDropped("Superseded by a newer frame")
+    if job.status == "expired":
+        raise DeadlineExceeded("Frame expired before inference started")
+    if job.status == "invalid":
+        raise ValueError(job.result)
+    raise RuntimeError(f"Pose worker failed: {job.result}")
+
+
+class InferenceService:
+    """Runs pose inference on a pool of worker processes pinned to CPU cores.
+
+    Every session is routed to the same worker, so its tracking graph stays
+    warm and its frames are processed in order. Each session has at most one
+    frame in flight and one waiting; a newer frame replaces the waiting one,
+    which fails with FrameDropped. Frames that are not picked up before their
+    deadline fail with DeadlineExceeded instead of delaying fresher ones.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, deadline=FRAME_DEADLINE, pin_cores=INFERENCE_PIN_CORES):
+        self.num_workers = max(1, workers)
+        self.deadline = deadline
+        self._ctx = multiprocessing.get_context("spawn")
+        pinnable = pin_cores and hasattr(os, "sched_getaffinity")
+        self._cores = sorted(os.sched_getaffinity(0)) if pinnable else [None]
+        self._job_queues = []
+        self._processes = []
+        self._results = None
+        self._lanes = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._ready = set()  # indexes of workers that have finished warming up
+        self._running = False
+
+    def start(self):
+        """Spawns the worker processes and the result collector thread."""
+        with self._lock:
+            if self._running:
+                return
+            self._results = self._ctx.Queue()
+            for index in range(self.num_workers):
+                self._job_queues.append(self._ctx.Queue())
+                self._processes.append(self._spawn(index))
+            self._running = True
+        threading.Thread(target=self._collect, daemon=True).start()
+        print(f"🧠 Started {self.num_workers} pose inference worker(s).")
+
+    def warmup(self):
+        """Starts the workers, which load their models in the background; see ``ready``."""
+        self.start()
+
+    @property
+    def ready(self):
+        """True once every worker has loaded its pose models."""
+        return self._running and len(self._ready) == self.num_workers
+
+    def detect(self, session_key, img_bytes, deadline=None, ladder=None):
+        """Returns the (33, 4) landmark array for an encoded frame, or None if nobody is in it.
+
+        ``ladder`` is the exercise's input-size ladder; see ml.RegionTracker.
+        """
+        if not self._running:
+            # Started on first use so spawned children re-importing __main__ never start a pool.
+            self.start()
+        deadline = deadline if deadline is not None else time.monotonic() + self.deadline
+        job = _Job(next(self._ids), session_key, img_bytes, deadline, ladder)
+        superseded = None
+        with self._lock:
+            lane = self._lanes.get(session_key)
+            if lane is None:
+                lane = self._lanes[session_key] = _Lane()
+            if lane.in_flight is None:
+                lane.in_flight = job
+                self._dispatch(job)
+            else:
+                superseded, lane.pending = lane.pending, job
+        if superseded is not None:
+            superseded.resolve("dropped")
+        return _wait_for(job)
+
+    def release(self, session_key):
+        """Closes the session's warm graph on the worker that owns it."""
+        if self._running:
+            self._job_queues[self._worker_for(session_key)].put(("release", None, session_key, None, None, None))
+
+    def shutdown(self):
+        """Stops every worker process."""
+        self._running = False
+        for jobs in self._job_queues:
+            jobs.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+
+    def _spawn(self, index):
+        core = self._cores[index % len(self._cores)]
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, core, self._job_queues[index], self._results),
+            name=f"pose-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _worker_for(self, session_key):
+        return zlib.crc32(repr(session_key).encode("utf-8")) % self.num_workers
+
+    def _dispatch(self, job):
+        """Sends a job to its session's worker. Caller holds the lock."""
+        self._jobs[job.id] = job
+        self._job_queues[self._worker_for(job.session_key)].put(
+            ("frame", job.id, job.session_key, job.payload, job.deadline, job.ladder)
+        )
+
+    def _collect(self):
+        """Resolves finished jobs and hands each session's waiting frame to its worker."""
+        next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+        while self._running:
+            # Checked on a timer, not only when idle: other workers can keep the queue busy indefinitely.
+            if time.monotonic() >= next_check:
+                self._respawn_dead_workers()
+                next_check = time.monotonic() + WORKER_CHECK_INTERVAL
+            try:
+                job_id, status, result = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+
+            if job_id is None:
+                self._ready.add(result)
+                print(f"🧠 Pose worker {result} is ready.")
+                continue
+            self._finish(job_id, status, result)
+
+    def _finish(self, job_id, status, result):
+        """Resolves a job and dispatches the frame waiting behind it, if still fresh."""
+        stale = None
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return
+            lane = self._lanes.get(job.session_key)
+            next_job = lane.pending if lane else None
+            if next_job is not None and next_job.deadline < time.monotonic():
+                stale, next_job = next_job, None
+            if lane is not None:
+                lane.pending = None
+                lane.in_flight = next_job
+                if next_job is not None:
+                    self._dispatch(next_job)
+                else:
+                    del self._lanes[job.session_key]
+        job.resolve(status, result)
+        if stale is not None:
+            stale.resolve("expired")
+
+    def _respawn_dead_workers(self):
+        for index, process in enumerate(self._processes):
+            if self._running and not process.is_alive():
+                print(f"❌ Pose worker {index} exited with code {process.exitcode}; restarting.")
+                self._ready.discard(index)
+                with self._lock:
+                    lost = [job.id for job in self._jobs.values() if self._worker_for(job.session_key) == index]
+                    # A worker killed inside get() can leave the old queue's lock held, so start afresh.
+                    self._job_queues[index] = self._ctx.Queue()
+                self._processes[index] = self._spawn(index)
+                for job_id in lost:
+                    self._finish(job_id, "error", "worker exited")
+
+
+class LocalInference:
+    """Runs pose inference in the calling thread on the module's shared PosePool."""
+
+    def __init__(self):
+        from ml import decode_frame, detect_pose, pose_pool
+        self._decode_frame = decode_frame
+        self._detect_pose = detect_pose
+        self._pose_pool = pose_pool
+
+    def start(self):
+        pass
+
+    def warmup(self):
+        """Loads MediaPipe and its models now; returns the seconds it took."""
+        return self._pose_pool.warmup()
+
+    @property
+    def ready(self):
+        return self._pose_pool.warmed
+
+    def detect(self, session_key, img_bytes, deadline=None, ladder=None):
+        """Returns the (33, 4) landmark array for an encoded frame, or None if nobody is in it."""
+        return self._detect_pose(self._decode_frame(img_bytes), session_key, ladder)
+
+    def release(self, session_key):
+        self._pose_pool.release(session_key)
+
+    def shutdown(self):
+        self._pose_pool.close()
+
+
+def create_inference_service(workers=INFERENCE_WORKERS):
+    """Builds the configured inference backend."""
+    if workers > 0:
+        return InferenceService(workers)
+    return LocalInference()
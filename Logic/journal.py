@@ -0,0 +1,272 @@
+import glob
+import os
+import threading
+from datetime import datetime
+
+from bson import ObjectId, json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from metrics import counter, stage
+from progress import DUPLICATE_KEY, apply_rollups
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per journal, as before
+    fcntl = None
+
+# --- Write-behind Journal Configuration ---
+WORKOUT_JOURNAL = os.getenv("WORKOUT_JOURNAL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "workout_journal.jsonl"))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", "1.0"))  # seconds between bulk flushes
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", "500"))
+JOURNAL_MAX_BACKOFF = 30.0
+
+JOURNAL_RECORDS = counter("replicai_journal_records_total", "Journaled workouts, by what happened to them.", ["outcome"])
+
+
+class WorkoutJournal:
+    """Acknowledges workout saves once they are on local disk and writes them to Mongo later.
+
+    Every save is appended to a JSONL file and fsynced before ``append``
+    returns. A background thread bulk-inserts pending workouts with
+    ``insert_many(ordered=False)`` and records how far it got in a checkpoint
+    file, so a restart replays only what was never flushed. Each workout
+    gets its ``_id`` when it is journaled, which makes replays and retries
+    idempotent: duplicate-key errors mean "already saved", and progress
+    rollups record the ids they have counted, so every workout in a batch is
+    rolled up again on retry without being counted twice. A batch stays
+    pending until both its insert and its rollups have succeeded.
+
+    Each process locks a journal file of its own: ``path`` if it is free,
+    otherwise ``path.1``, ``path.2`` and so on, so forked server workers
+    never share one. Workouts left in a numbered journal that no live
+    process holds are moved into this process's journal on start.
+    """
+
+    def __init__(self, workouts, users, rollups, path=WORKOUT_JOURNAL,
+                 flush_interval=JOURNAL_FLUSH_INTERVAL, batch_size=JOURNAL_BATCH_SIZE):
+        self.workouts = workouts
+        self.users = users
+        self.rollups = rollups
+        self.base_path = path
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []  # (end offset in the journal, workout)
+        self._known_users = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._file = None
+        self._thread = None
+        self._stopping = False
+
+    # --- Public API ---
+    def start(self):
+        """Replays unflushed workouts from disk and starts the flusher thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._file = self._claim()
+            self._replay()
+            self._adopt_orphans()
+            self._file.seek(0, os.SEEK_END)
+            self._thread = threading.Thread(target=self._run, name="workout-journal", daemon=True)
+            self._thread.start()
+        if self._pending:
+            print(f"🏋️  Replaying {len(self._pending)} unflushed workout(s) from the journal.")
+            self._wake.set()
+
+    def append(self, workout):
+        """Durably journals a workout and returns its _id; Mongo sees it on the next flush."""
+        if self._thread is None:
+            self.start()
+        workout = dict(workout, _id=ObjectId())
+        line = (json_util.dumps(workout) + "\n").encode("utf-8")
+        with stage("journal_append"), self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending.append((self._file.tell(), workout))
+        self._wake.set()
+        return workout["_id"]
+
+    def flush(self):
+        """Writes every pending workout to Mongo; returns False if a batch failed."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.batch_size]
+                if not batch:
+                    self._compact()
+                    return True
+                try:
+                    with stage("db_flush"):
+                        self._write(batch)
+                except Exception as e:
+                    print(f"❌ Error flushing workout journal ({len(batch)} pending): {e}")
+                    return False
+                self._save_checkpoint(batch[-1][0])
+                with self._lock:
+                    del self._pending[:len(batch)]
+
+    def close(self):
+        """Flushes what it can and stops the flusher thread."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    # --- Flushing ---
+    def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping:
+            self._wake.wait(backoff)
+            self._wake.clear()
+            if self._stopping:
+                break
+            if self.flush():
+                backoff = self.flush_interval
+            else:
+                backoff = min(backoff * 2, JOURNAL_MAX_BACKOFF)
+
+    def _write(self, batch):
+        if self.workouts is None:
+            raise RuntimeError("no database connection")
+        workouts = [workout for _, workout in batch]
+        self._ensure_users({workout["user_id"] for workout in workouts})
+
+        duplicates = set()
+        try:
+            self.workouts.insert_many(workouts, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            # Already saved by an earlier flush that died before its checkpoint.
+            duplicates = {error["index"] for error in errors}
+
+        # A duplicate may be a write whose acknowledgement was lost, so its rollup
+        # is not known to have landed; apply_rollups skips the ones that did.
+        apply_rollups(self.rollups, workouts)
+        JOURNAL_RECORDS.labels("flushed").inc(len(workouts) - len(duplicates))
+        JOURNAL_RECORDS.labels("duplicate").inc(len(duplicates))
+
+    def _ensure_users(self, user_ids):
+        """Upserts each user document once per process instead of once per save."""
+        new_users = user_ids - self._known_users
+        if not new_users:
+            return
+        now = datetime.utcnow()
+        self.users.bulk_write([
+            UpdateOne({'_id': user_id}, {'$setOnInsert': {'_id': user_id, 'created_at': now}}, upsert=True)
+            for user_id in new_users
+        ], ordered=False)
+        self._known_users |= new_users
+
+    # --- Files ---
+    def _claim(self):
+        """Opens and locks the first journal file no other process holds."""
+        if fcntl is None:
+            return open(self.path, "ab")
+        for index in range(1024):
+            path = self.base_path if index == 0 else f"{self.base_path}.{index}"
+            f = open(path, "ab")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            self.path = path
+            self.checkpoint_path = path + ".checkpoint"
+            return f
+        raise RuntimeError(f"Every workout journal under {self.base_path} is locked")
+
+    def _replay(self):
+        """Loads journaled workouts past the checkpoint, dropping a torn final line."""
+        self._pending.extend(_read_journal(self.path, _load_checkpoint(self.checkpoint_path)))
+
+    def _adopt_orphans(self):
+        """Moves unflushed workouts out of numbered journals whose process has exited."""
+        if fcntl is None:
+            return
+        for path in glob.glob(glob.escape(self.base_path) + ".*"):
+            if path == self.path or not path.rsplit(".", 1)[-1].isdigit():
+                continue
+            with open(path, "r+b") as orphan:
+                try:
+                    fcntl.flock(orphan.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # a live worker's journal
+                entries = _read_journal(path, _load_checkpoint(path + ".checkpoint"))
+                if entries:
+                    self._file.seek(0, os.SEEK_END)
+                    for _, workout in entries:
+                        self._file.write((json_util.dumps(workout) + "\n").encode("utf-8"))
+                        self._file.flush()
+                        self._pending.append((self._file.tell(), workout))
+                    os.fsync(self._file.fileno())
+                    print(f"🏋️  Adopted {len(entries)} unflushed workout(s) from {path}.")
+                orphan.truncate(0)
+                _save_checkpoint(path + ".checkpoint", 0)
+
+    def _compact(self):
+        """Empties the journal once everything in it has reached Mongo."""
+        with self._lock:
+            if self._pending or self._file is None or self._file.tell() == 0:
+                return
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._save_checkpoint(0)
+
+    def _save_checkpoint(self, offset):
+        _save_checkpoint(self.checkpoint_path, offset)
+
+
+def _read_journal(path, offset):
+    """Returns the (end offset, workout) pairs past ``offset``, dropping a torn final line."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if offset > size:
+            offset = 0
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            entries.append((offset, json_util.loads(line)))
+    if offset < size:
+        print(f"WARNING: Dropping {size - offset} byte(s) of a partially written journal entry.")
+        os.truncate(path, offset)
+    return entries
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _save_checkpoint(path, offset):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,445 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+
+# --- Load Test Configuration ---
+DEFAULT_SESSIONS = "1,2,4,8"
+DEFAULT_FPS = 5.0
+DEFAULT_DURATION = 20.0  # seconds each concurrency level runs
+LATENCY_BUDGET_MS = 200.0  # a frame slower than one capture interval holds the client back
+STUB_DOMAIN = "loadtest.invalid"
+STUB_AUDIENCE = "replicai-loadtest"
+
+
+# --- Local Stand-ins ---
+class StubIssuer:
+    """Signs access tokens with a throwaway RSA key and serves its JWKS on localhost.
+
+    The app's validator fetches keys from ``jwks_url`` exactly as it would
+    from Auth0, so token validation runs unchanged.
+    """
+
+    def __init__(self, domain=STUB_DOMAIN, audience=STUB_AUDIENCE):
+        from authlib.jose import JsonWebKey
+        from werkzeug.serving import make_server
+
+        self.issuer = f"https://{domain}/"
+        self.audience = audience
+        self.key = JsonWebKey.generate_key("RSA", 2048, is_private=True, options={"kid": "loadtest"})
+        jwks = json.dumps({"keys": [self.key.as_dict(is_private=False)]}).encode("utf-8")
+
+        def serve_jwks(environ, start_response):
+            start_response("200 OK", [("Content-Type", "application/json")])
+            return [jwks]
+
+        self._server = make_server("127.0.0.1", 0, serve_jwks)
+        self.jwks_url = f"http://127.0.0.1:{self._server.server_port}/.well-known/jwks.json"
+        threading.Thread(target=self._server.serve_forever, name="stub-issuer", daemon=True).start()
+
+    def token(self, sub, lifetime=3600):
+        from authlib.jose import jwt
+
+        now = int(time.time())
+        claims = {"sub": sub, "iss": self.issuer, "aud": self.audience, "iat": now, "exp": now + lifetime}
+        return jwt.encode({"alg": "RS256", "kid": "loadtest"}, claims, self.key).decode("ascii")
+
+    def close(self):
+        self._server.shutdown()
+
+
+class MemoryCollection:
+    """Just enough of a pymongo collection for the save path; documents are kept by _id."""
+
+    def __init__(self):
+        self.documents = {}
+        self.bulk_operations = 0
+        self._lock = threading.Lock()
+
+    def create_index(self, keys, **kwargs):
+        return kwargs.get("name")
+
+    def insert_many(self, documents, ordered=True):
+        with self._lock:
+            for document in documents:
+                self.documents[document["_id"]] = document
+
+    def bulk_write(self, operations, ordered=True):
+        with self._lock:
+            self.bulk_operations += len(operations)
+
+
+class MemoryMongo:
+    """An in-memory stand-in for MongoClient, so load tests need no database."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def get_database(self, name):
+        return self
+
+    def get_collection(self, name):
+        return self._collections.setdefault(name, MemoryCollection())
+
+
+# --- Frame Sources ---
+def load_video_frames(path, fps=DEFAULT_FPS, size=(640, 480), quality=80):
+    """Decodes a recorded video into JPEG frames sampled at ``fps``."""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video '{path}'")
+    step = max(1, round((capture.get(cv2.CAP_PROP_FPS) or fps) / fps))
+    frames = []
+    index = 0
+    while True:
+        ok, image = capture.read()
+        if not ok:
+            break
+        if index % step == 0:
+            image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+            frames.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+        index += 1
+    capture.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from '{path}'")
+    return frames
+
+
+# --- Simulated Sessions ---
+class LevelStats:
+    """Latencies and outcomes collected from every session at one concurrency level."""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.dropped = 0
+        self.replaced = 0
+        self.motion_skipped = 0
+        self.errors = 0
+        self.saves = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms, result):
+        with self._lock:
+            if result is None:
+                self.errors += 1
+                return
+            self.latencies_ms.append(latency_ms)
+            self.dropped += bool(result.get("dropped"))
+            self.motion_skipped += bool(result.get("motion_skipped"))
+
+    def record_replaced(self, count):
+        """Counts streamed frames the server skipped because a newer one arrived."""
+        with self._lock:
+            self.replaced += count
+
+    def record_save(self):
+        with self._lock:
+            self.saves += 1
+
+    def summary(self, sessions, elapsed, budget_ms=LATENCY_BUDGET_MS):
+        latencies = np.asarray(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        frames = len(self.latencies_ms)
+        return {
+            "sessions": sessions,
+            "frames": frames,
+            "fps": round(frames / elapsed, 1),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(float(latencies.max()), 1),
+            "over_budget": round(float((latencies > budget_ms).mean()), 3) if frames else 0.0,
+            "dropped": self.dropped,
+            "replaced": self.replaced,
+            "skipped": self.motion_skipped,
+            "errors": self.errors,
+            "saves": self.saves,
+        }
+
+
+def _start_session(http, base_url, stats):
+    """Resets a fresh session id over HTTP, as the app does before streaming; None if that failed."""
+    import requests
+
+    session_id = str(uuid.uuid4())
+    try:
+        http.post(f"{base_url}/api/reset", json={"session_id": session_id}, timeout=10).raise_for_status()
+    except requests.RequestException as e:
+        print(f"❌ Reset failed: {e}")
+        stats.record(0.0, None)
+        return None
+    return session_id
+
+
+def _save_session(http, base_url, exercise_type, session_id, last, elapsed, stats):
+    """Saves the workout the way the app does, from the last analysis the session received."""
+    import requests
+
+    workout = {
+        "exercise_type": exercise_type,
+        "rep_count": last.get("good_reps", 0),
+        "duration_seconds": round(elapsed),
+        "average_accuracy": last.get("accuracy", 0),
+        "session_id": session_id,
+    }
+    try:
+        http.post(f"{base_url}/api/workout", json=workout, timeout=10).raise_for_status()
+        stats.record_save()
+    except requests.RequestException as e:
+        print(f"❌ Save failed: {e}")
+        stats.record(0.0, None)
+
+
+def _paced(fps, duration):
+    """Yields once per frame slot at ``fps`` until ``duration`` seconds have passed."""
+    interval = 1.0 / fps
+    started = time.monotonic()
+    next_at = started
+    while time.monotonic() - started < duration:
+        yield
+        next_at += interval
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_at = time.monotonic()  # behind schedule: send the next frame now, don't burst
+
+
+def _analyze_over_http(http, base_url, token, exercise_type, session_id, frames, fps, duration, stats, offset):
+    """Posts frames to /api/analyze one at a time, so a slow server lowers the achieved rate."""
+    import requests
+
+    last = {}
+    index = offset
+    for _ in _paced(fps, duration):
+        sent = time.perf_counter()
+        try:
+            response = http.post(
+                f"{base_url}/api/analyze",
+                params={"exercise": exercise_type, "session_id": session_id},
+                data=frames[index % len(frames)],
+                headers={"Content-Type": "image/jpeg"},
+                timeout=10,
+            )
+            result = response.json() if response.status_code == 200 else None
+        except (requests.RequestException, ValueError):
+            result = None
+        stats.record((time.perf_counter() - sent) * 1000.0, result)
+        last = result or last
+        index += 1
+    return last
+
+
+def _analyze_over_stream(http, base_url, token, exercise_type, session_id, frames, fps, duration, stats, offset):
+    """Streams frames over /api/stream on a timer without waiting for replies, like the app.
+
+    The server analyzes only the newest frame and reports how many it has
+    skipped in ``dropped_frames`` once each analysis finishes. Frames skipped
+    during one analysis come before the next analyzed frame, so reply n
+    answers frame n plus the count the previous reply carried; latency is
+    measured from that frame's send time.
+    """
+    import simple_websocket
+
+    try:
+        ws = simple_websocket.Client.connect(base_url.replace("http", "ws", 1) + "/api/stream")
+        ws.send(json.dumps({"token": token, "exercise": exercise_type, "session_id": session_id}))
+        ready = json.loads(ws.receive(timeout=10) or "{}")
+        if ready.get("type") != "ready":
+            raise ValueError(ready.get("error", "no ready message"))
+    except Exception as e:
+        print(f"❌ Stream failed to open: {e}")
+        stats.record(0.0, None)
+        return {}
+
+    sent_at = []
+    answered = threading.Event()
+    state = {"last": {}, "answered": 0, "dropped": 0}
+
+    def read_replies():
+        replies = 0
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    continue
+                result = json.loads(message)
+                replies += 1
+                frame = min(replies + state["dropped"], len(sent_at)) - 1
+                stats.record((time.perf_counter() - sent_at[frame]) * 1000.0, None if "error" in result else result)
+                state["dropped"] = result.get("dropped_frames", state["dropped"])
+                state["answered"] = replies + state["dropped"]
+                if "error" not in result:
+                    state["last"] = result
+                answered.set()
+        except (simple_websocket.ConnectionClosed, ValueError):
+            answered.set()
+
+    reader = threading.Thread(target=read_replies, daemon=True)
+    reader.start()
+    index = offset
+    try:
+        for _ in _paced(fps, duration):
+            sent_at.append(time.perf_counter())
+            ws.send(frames[index % len(frames)])
+            index += 1
+        # Let the frame in flight come back before hanging up.
+        deadline = time.monotonic() + 10
+        while state["answered"] < len(sent_at) and time.monotonic() < deadline and reader.is_alive():
+            answered.wait(0.1)
+            answered.clear()
+    except simple_websocket.ConnectionClosed:
+        print("❌ Stream closed by the server")
+        stats.record(0.0, None)
+    finally:
+        ws.close()
+    stats.record_replaced(state["dropped"])
+    return state["last"]
+
+
+PROTOCOLS = {"ws": _analyze_over_stream, "http": _analyze_over_http}
+
+
+def run_session(base_url, token, exercise_type, frames, fps, duration, stats, offset=0, protocol="ws"):
+    """Plays one client: reset, frames at ``fps`` for ``duration`` seconds, then a save."""
+    import requests
+
+    http = requests.Session()
+    http.headers["Authorization"] = f"Bearer {token}"
+    started = time.monotonic()
+    session_id = _start_session(http, base_url, stats)
+    if session_id is None:
+        return
+    last = PROTOCOLS[protocol](http, base_url, token, exercise_type, session_id, frames, fps, duration, stats, offset)
+    _save_session(http, base_url, exercise_type, session_id, last, time.monotonic() - started, stats)
+
+
+def run_level(base_url, issuer, sessions, exercise_type, frames, fps, duration, protocol="ws"):
+    """Runs ``sessions`` clients side by side and summarizes them."""
+    stats = LevelStats()
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(base_url, issuer.token(f"loadtest|user-{index}"), exercise_type, frames, fps, duration, stats,
+                  index * len(frames) // sessions, protocol),
+            daemon=True,
+        )
+        for index in range(sessions)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(sessions, time.monotonic() - started)
+
+
+# --- In-process Server ---
+def start_app(issuer, mongo, ready_timeout=120.0):
+    """Serves the app on a free localhost port; returns (base URL, app module, server)."""
+    from werkzeug.serving import make_server
+    import app as api
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request access log
+    api.validator.jwks.url = issuer.jwks_url
+    api.startup(mongo)
+    server = make_server("127.0.0.1", 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    import requests
+
+    deadline = time.monotonic() + ready_timeout
+    while requests.get(f"{base_url}/readyz", timeout=5).status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError("App did not become ready in time")
+        time.sleep(0.25)
+    return base_url, api, server
+
+
+def _print_table(rows):
+    columns = ("sessions", "fps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "over_budget", "dropped", "replaced", "skipped", "errors")
+    print("".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print("".join(f"{row[column]:>12}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulates concurrent workout sessions against an in-process backend and reports latency by concurrency."
+    )
+    parser.add_argument("--sessions", default=DEFAULT_SESSIONS, help="comma-separated concurrency levels to run in turn")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="frames per second each session sends")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds each level runs")
+    parser.add_argument("--exercise", default="squat", help="exercise type every session performs")
+    parser.add_argument("--protocol", choices=sorted(PROTOCOLS), default="ws",
+                        help="stream frames over the /api/stream WebSocket like the app (ws), or post them to /api/analyze (http)")
+    parser.add_argument("--frames", help="directory of recorded JPEG/WebP frames to replay")
+    parser.add_argument("--video", help="recorded video to replay, sampled at --fps")
+    parser.add_argument("--budget-ms", type=float, default=LATENCY_BUDGET_MS, help="p95 latency a level must stay under")
+    parser.add_argument("--stop-over-budget", action="store_true", help="stop ramping once a level's p95 exceeds the budget")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    levels = sorted({int(level) for level in args.sessions.split(",") if level.strip()})
+
+    # Everything the app reads at import: stub auth, offline coaching and throwaway journal/recordings.
+    scratch = tempfile.mkdtemp(prefix="replicai-loadtest-")
+    os.environ["AUTH0_DOMAIN"] = STUB_DOMAIN
+    os.environ["AUTH0_API_AUDIENCE"] = STUB_AUDIENCE
+    os.environ["COACH_PROVIDER"] = "stub"
+    os.environ["WORKOUT_JOURNAL"] = os.path.join(scratch, "workout_journal.jsonl")
+    os.environ["RECORDINGS_DIR"] = os.path.join(scratch, "recordings")
+
+    from bench import load_fixture_frames, render_fixture_frames
+
+    if args.video:
+        frames = load_video_frames(args.video, args.fps)
+    elif args.frames:
+        frames = load_fixture_frames(args.frames)
+    else:
+        # Rendered figures are one clean pose on a flat background, which tracks more cheaply
+        # than a real camera; replay a real recording for capacity numbers.
+        print("WARNING: No --frames or --video given; rendered frames may understate pose inference cost.")
+        frames = render_fixture_frames(args.exercise, count=60)
+
+    issuer = StubIssuer()
+    mongo = MemoryMongo()
+    base_url, api, server = start_app(issuer, mongo)
+    print(f"✅ App ready at {base_url}; replaying {len(frames)} frame(s) of {args.exercise} at {args.fps} fps per session over {args.protocol}.")
+
+    rows = []
+    for sessions in levels:
+        row = run_level(base_url, issuer, sessions, args.exercise, frames, args.fps, args.duration, args.protocol)
+        rows.append(row)
+        print(f"🏋️  {sessions} session(s): {row['fps']} fps, p95 {row['p95_ms']} ms, {row['dropped']} dropped, {row['replaced']} replaced, {row['errors']} error(s)")
+        if args.stop_over_budget and row["p95_ms"] > args.budget_ms:
+            break
+
+    api.workout_journal.flush()
+    server.shutdown()
+    issuer.close()
+    print()
+    _print_table(rows)
+    within = [row["sessions"] for row in rows if row["p95_ms"] <= args.budget_ms and not row["errors"]]
+    if within:
+        print(f"Capacity: {max(within)} concurrent session(s) with p95 <= {args.budget_ms:.0f} ms.")
+    else:
+        print(f"No level kept p95 under {args.budget_ms:.0f} ms.")
+    saved = len(mongo.get_collection("workouts").documents)
+    print(f"{saved} of {sum(row['saves'] for row in rows)} saved workout(s) reached the database.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"fps": args.fps, "exercise": args.exercise, "protocol": args.protocol, "levels": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,437 @@
+import math
+
 import cv2
-import mediapipe as mp
 import numpy as np
 import time
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 import threading
+from exercises import DEFAULT_INPUT_LADDER, load_exercises
+from metrics import FRAMES, counter, stage
 
-# --- Load API Key and Configure Gemini ---
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("WARNING: GEMINI_API_KEY not found. Gemini features disabled.")
-    gemini_model = None
-else:
-    genai.configure(api_key=api_key)
-    gemini_model = genai.GenerativeModel('gemini-pro-vision')
-
-# --- Initialize MediaPipe ---
-mp_pose = mp.solutions.pose
-# FIX: The pose model will now be created on-demand in process_frame
-# pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+# --- MediaPipe ---
+# Imported on first use rather than with this module: it drags in matplotlib and
+# takes most of a second, which servers should pay during startup, not at import.
+_mp_pose = None
+_mp_lock = threading.Lock()
+
+
+def pose_solution():
+    """Returns mediapipe.solutions.pose, importing MediaPipe the first time."""
+    global _mp_pose
+    if _mp_pose is None:
+        with _mp_lock:
+            if _mp_pose is None:
+                import mediapipe as mp
+                _mp_pose = mp.solutions.pose
+    return _mp_pose
+
+# --- Exercise Rules ---
+# Compiled once at startup from exercises.json; add exercises there, not here.
+EXERCISES = load_exercises()
+
+# --- Warm Pose Pool ---
+# Tracking graphs per process; sessions beyond this share one single-image graph.
+# There is never any use for more graphs than sessions, so MAX_SESSIONS caps it.
+POSE_POOL_SIZE = min(int(os.getenv("POSE_POOL_SIZE", "16")), int(os.getenv("MAX_SESSIONS", "1024")))
+POSE_IDLE_TIMEOUT = float(os.getenv("POSE_IDLE_TIMEOUT", "120"))
+POSE_WARM_SPARES = int(os.getenv("POSE_WARM_SPARES", "1"))  # pre-warmed graphs kept ready for new sessions
+POSE_FRAMES = counter("replicai_pose_frames_total", "Pose inference runs, by the graph that served them.", ["graph"])
+
+# --- Region of Interest ---
+# Off by default: with the legacy fixed-size Pose model it has not shown a latency win,
+# and tracking mode already looks around the previous pose on its own.
+POSE_REGION_TRACKING = os.getenv("POSE_REGION_TRACKING", "0") != "0"
+ROI_MARGIN = float(os.getenv("ROI_MARGIN", "0.25"))  # padding around the landmark box, as a fraction of its longest side
+ROI_MIN_SIZE = 0.25  # smallest crop side, as a fraction of the frame's shorter side
+ROI_VISIBILITY = 0.5  # landmarks below this don't shape the box
+LADDER_CONFIDENT = 0.8  # mean visibility that counts towards stepping down to a faster rung
+LADDER_UNSURE = 0.6  # below this, step straight up to a sharper rung
+LADDER_STEP_DOWN_FRAMES = 10
+
+# --- Temporal Filtering ---
+FILTER_MIN_CUTOFF = float(os.getenv("FILTER_MIN_CUTOFF", "1.0"))  # Hz; lower smooths jitter more when still
+FILTER_BETA = float(os.getenv("FILTER_BETA", "100"))  # how quickly the cutoff opens up with speed
+FILTER_D_CUTOFF = 1.0  # Hz, for the speed estimate itself
+FILTER_MAX_GAP = 1.0  # seconds; longer gaps restart the filter instead of smoothing across them
+
+
+def create_pose(static_image_mode=False):
+    """Builds a Pose graph, in video (tracking) mode unless ``static_image_mode`` is set."""
+    return pose_solution().Pose(static_image_mode=static_image_mode, min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+
+class RegionTracker:
+    """Chooses the crop and input size for a session's next frame from its last landmarks.
+
+    The crop is the visible landmarks' bounding box plus ``ROI_MARGIN``. It
+    is only moved when the body nears its edge or it has grown much larger
+    than needed, because every move shifts the coordinate frame the Pose
+    graph is tracking in. The crop is then downscaled so its longest side
+    fits the current rung of the exercise's input ladder: steady, confident
+    frames step down to a faster rung, shaky ones step back up, and losing
+    the person resets to the full frame at the sharpest rung.
+    """
+    __slots__ = ("roi", "rung", "streak")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.roi = None  # (x0, y0, x1, y1) in normalized full-frame coordinates
+        self.rung = None  # index into the ladder; None means the sharpest
+        self.streak = 0
+
+    def prepare(self, image_rgb, ladder):
+        """Returns the pose input for a frame and the normalized (x0, y0, width, height) region it covers."""
+        height, width = image_rgb.shape[:2]
+        if self.rung is None or self.rung >= len(ladder):
+            self.rung = len(ladder) - 1
+        x0, y0, x1, y1 = self.roi or (0.0, 0.0, 1.0, 1.0)
+        left, top = int(x0 * width), int(y0 * height)
+        right = max(left + 1, min(width, math.ceil(x1 * width)))
+        bottom = max(top + 1, min(height, math.ceil(y1 * height)))
+        crop = image_rgb[top:bottom, left:right]
+        scale = ladder[self.rung] / max(crop.shape[:2])
+        if scale < 1.0:
+            size = (max(1, round(crop.shape[1] * scale)), max(1, round(crop.shape[0] * scale)))
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_LINEAR)
+        else:
+            # MediaPipe needs contiguous memory; a slice of the frame isn't.
+            crop = np.ascontiguousarray(crop)
+        return crop, (left / width, top / height, (right - left) / width, (bottom - top) / height)
+
+    def update(self, points, width, height, ladder):
+        """Moves the crop and the rung after a frame; ``points`` are full-frame landmarks or None."""
+        visible = points[points[:, 3] >= ROI_VISIBILITY, :2] if points is not None else ()
+        if len(visible) < 4:
+            self.reset()
+            return
+
+        confidence = float(points[:, 3].mean())
+        if confidence < LADDER_UNSURE:
+            self.rung = min(self.rung + 1, len(ladder) - 1)
+            self.streak = 0
+        elif confidence >= LADDER_CONFIDENT:
+            self.streak += 1
+            if self.streak >= LADDER_STEP_DOWN_FRAMES and self.rung > 0:
+                self.rung -= 1
+                self.streak = 0
+        else:
+            self.streak = 0
+
+        # Work in pixels so the margin and minimum size are the same on both axes.
+        xy = visible * (width, height)
+        (bx0, by0), (bx1, by1) = xy.min(axis=0), xy.max(axis=0)
+        pad = ROI_MARGIN * max(bx1 - bx0, by1 - by0)
+        min_side = ROI_MIN_SIZE * min(width, height)
+        cx, cy = (bx0 + bx1) / 2, (by0 + by1) / 2
+        half_w = max(bx1 - bx0 + 2 * pad, min_side) / 2
+        half_h = max(by1 - by0 + 2 * pad, min_side) / 2
+        wanted = (
+            max(0.0, (cx - half_w) / width), max(0.0, (cy - half_h) / height),
+            min(1.0, (cx + half_w) / width), min(1.0, (cy + half_h) / height),
+        )
+        if self.roi is None:
+            self.roi = wanted
+            return
+        # Keep the current crop while the body stays half a margin clear of its edges.
+        x0, y0, x1, y1 = self.roi
+        inner = ((bx0 - pad / 2) / width, (by0 - pad / 2) / height, (bx1 + pad / 2) / width, (by1 + pad / 2) / height)
+        contained = (x0 <= max(inner[0], 0.0) and y0 <= max(inner[1], 0.0)
+                     and x1 >= min(inner[2], 1.0) and y1 >= min(inner[3], 1.0))
+        oversized = (x1 - x0) * (y1 - y0) > 2.0 * (wanted[2] - wanted[0]) * (wanted[3] - wanted[1])
+        if not contained or oversized:
+            self.roi = wanted
+
+
+def _alpha(dt, cutoff):
+    return 1.0 / (1.0 + 1.0 / (2.0 * np.pi * cutoff * dt))
+
+
+class OneEuroFilter:
+    """One Euro filter (Casiez et al., 2012) applied element-wise to an array signal.
+
+    The cutoff frequency rises with the signal's speed, so jitter is smoothed
+    away while the body is still, but fast movements are followed with
+    almost no lag.
+    """
+    __slots__ = ("min_cutoff", "beta", "d_cutoff", "value", "derivative", "timestamp")
+
+    def __init__(self, min_cutoff=FILTER_MIN_CUTOFF, beta=FILTER_BETA, d_cutoff=FILTER_D_CUTOFF):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.derivative = None
+        self.timestamp = None
+
+    def __call__(self, value, timestamp):
+        """Returns the filtered signal for a sample taken at ``timestamp`` seconds."""
+        if self.value is None or timestamp <= self.timestamp:
+            self.value = value.copy()
+            self.derivative = np.zeros_like(value)
+            self.timestamp = timestamp
+            return self.value
+        dt = timestamp - self.timestamp
+        speed = (value - self.value) / dt
+        self.derivative += _alpha(dt, self.d_cutoff) * (speed - self.derivative)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.derivative)
+        self.value += _alpha(dt, cutoff) * (value - self.value)
+        self.timestamp = timestamp
+        return self.value
+
+
+class TemporalFilter:
+    """Per-session temporal layer between pose estimation and the exercise state machine.
+
+    Landmark positions are smoothed with a One Euro filter; visibility is
+    passed through untouched. The state machine runs once per frame on the
+    smoothed landmarks, which are also what session recordings store, so
+    re-scoring a recording sees exactly what the live tracker saw.
+    """
+    __slots__ = ("landmarks", "timestamp", "points")
+
+    def __init__(self):
+        self.landmarks = OneEuroFilter()
+        self.reset()
+
+    def reset(self):
+        self.landmarks.reset()
+        self.timestamp = None
+        self.points = None  # the last smoothed frame, which is what session recordings store
+
+    def smooth(self, points, timestamp):
+        """Returns a (33, 4) copy of ``points`` with filtered x, y, z."""
+        if self.timestamp is not None and not 0.0 < timestamp - self.timestamp <= FILTER_MAX_GAP:
+            self.reset()
+        smoothed = points.copy()
+        smoothed[:, :3] = self.landmarks(points[:, :3], timestamp)
+        self.timestamp = timestamp
+        self.points = smoothed
+        return smoothed
+
+
+class _PoseEntry:
+    __slots__ = ("pose", "lock", "last_used", "region")
+
+    def __init__(self, static_image_mode=False):
+        self.pose = create_pose(static_image_mode)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.region = RegionTracker()
+
+    def warm(self):
+        """Runs a blank frame through the graph, which is when MediaPipe actually loads its models."""
+        self.pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
+
+
+class PosePool:
+    """Keeps one warm, tracking-mode Pose graph per active session.
+
+    The graph stamps every packet with a monotonically increasing timestamp,
+    so a session must always be fed from the same instance. Entries are
+    closed after sitting idle for ``idle_timeout`` seconds or explicitly via
+    ``release``, never to make room: taking a live session's graph would
+    cost it its tracking and rebuild a graph on nearly every frame. While
+    every slot is held, further sessions share one single-image graph and
+    get a tracking graph of their own once a slot frees up.
+
+    A graph's first frame is several times slower than the rest, so up to
+    ``spares`` already-warmed graphs are kept aside for new sessions and
+    topped up in the background whenever one is taken.
+    """
+
+    def __init__(self, max_size=POSE_POOL_SIZE, idle_timeout=POSE_IDLE_TIMEOUT, spares=POSE_WARM_SPARES,
+                 region_tracking=POSE_REGION_TRACKING):
+        self.max_size = max_size
+        self.region_tracking = region_tracking
+        self.idle_timeout = idle_timeout
+        self.spares = spares
+        self.warmed = False
+        self._entries = {}
+        self._spares = []
+        self._shared = None  # single-image graph for frames the pool has no slot for
+        self._refilling = False
+        self._lock = threading.Lock()
+
+    def warmup(self):
+        """Imports MediaPipe and fills the spare graphs; returns the seconds it took."""
+        started = time.perf_counter()
+        pose_solution()
+        with self._lock:
+            self._refilling = True
+        self._refill()
+        if not self.spares:
+            # Still load the models once, so the first session only pays for its own graph.
+            entry = _PoseEntry()
+            entry.warm()
+            self._close(entry)
+        self.warmed = True
+        return time.perf_counter() - started
+
+    def process(self, session_key, image_rgb):
+        """Runs pose estimation for a session on its warm graph."""
+        entry = self._checkout(session_key) if session_key is not None else None
+        graph = "tracking"
+        if entry is None:
+            # No session, or every slot belongs to a live one.
+            entry, graph = self._checkout_shared(), "shared"
+        if entry.pose is None:
+            # The entry was evicted while we waited for it; start over.
+            entry.lock.release()
+            return self.process(session_key, image_rgb)
+        try:
+            POSE_FRAMES.labels(graph).inc()
+            return entry.pose.process(image_rgb)
+        finally:
+            entry.last_used = time.monotonic()
+            entry.lock.release()
+
+    def detect(self, session_key, image_rgb, ladder=None):
+        """Returns a session's (33, 4) full-frame landmarks, or None.
+
+        With ``region_tracking`` the frame is first cropped and downscaled
+        around the session's last pose (see RegionTracker).
+        """
+        ladder = ladder or DEFAULT_INPUT_LADDER
+        entry = self._checkout(session_key) if session_key is not None else None
+        if entry is None:
+            pose_landmarks = self.process(None, image_rgb).pose_landmarks
+            return landmarks_to_array(pose_landmarks) if pose_landmarks is not None else None
+        if entry.pose is None:
+            entry.lock.release()
+            return self.detect(session_key, image_rgb, ladder)
+        POSE_FRAMES.labels("tracking").inc()
+        try:
+            if not self.region_tracking:
+                pose_landmarks = entry.pose.process(image_rgb).pose_landmarks
+                return landmarks_to_array(pose_landmarks) if pose_landmarks is not None else None
+            height, width = image_rgb.shape[:2]
+            points = self._detect_region(entry, image_rgb, ladder)
+            if points is None and entry.region.roi is not None:
+                # Lost them inside the crop; look at the whole frame before giving up.
+                entry.region.reset()
+                points = self._detect_region(entry, image_rgb, ladder)
+            entry.region.update(points, width, height, ladder)
+            return points
+        finally:
+            entry.last_used = time.monotonic()
+            entry.lock.release()
+
+    @staticmethod
+    def _detect_region(entry, image_rgb, ladder):
+        """Runs the entry's graph on its current crop and maps landmarks back to the full frame."""
+        crop, (x0, y0, crop_w, crop_h) = entry.region.prepare(image_rgb, ladder)
+        pose_landmarks = entry.pose.process(crop).pose_landmarks
+        if pose_landmarks is None:
+            return None
+        points = landmarks_to_array(pose_landmarks)
+        points[:, 0] = x0 + points[:, 0] * crop_w
+        points[:, 1] = y0 + points[:, 1] * crop_h
+        # MediaPipe scales z like x, i.e. by the width of the image it was given.
+        points[:, 2] *= crop_w
+        return points
+
+    def release(self, session_key):
+        """Closes and drops the graph belonging to a session, if any."""
+        with self._lock:
+            entry = self._entries.pop(session_key, None)
+        if entry is not None:
+            self._close(entry)
+
+    def evict_idle(self):
+        """Closes every graph that has been idle longer than the timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.last_used < cutoff]
+            evicted = [self._entries.pop(key) for key in stale]
+        for entry in evicted:
+            self._close(entry)
+
+    def close(self):
+        """Closes every graph in the pool."""
+        with self._lock:
+            entries = list(self._entries.values()) + self._spares
+            if self._shared is not None:
+                entries.append(self._shared)
+            self._entries.clear()
+            self._spares = []
+            self._shared = None
+            self.spares = 0
+        for entry in entries:
+            self._close(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _checkout(self, session_key):
+        """Returns the session's entry with its lock held, or None if every slot belongs to a live session."""
+        self.evict_idle()
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None and len(self._entries) >= self.max_size:
+                return None
+            refill = False
+            if entry is None:
+                entry = self._spares.pop() if self._spares else _PoseEntry()
+                entry.last_used = time.monotonic()
+                self._entries[session_key] = entry
+                refill = self.spares > 0 and not self._refilling
+                self._refilling = self._refilling or refill
+        if refill:
+            threading.Thread(target=self._refill, name="pose-spares", daemon=True).start()
+        entry.lock.acquire()
+        return entry
+
+    def _refill(self):
+        """Warms graphs until there are ``spares`` of them set aside."""
+        while True:
+            with self._lock:
+                if len(self._spares) >= self.spares:
+                    self._refilling = False
+                    return
+            entry = _PoseEntry()
+            entry.warm()
+            with self._lock:
+                self._spares.append(entry)
+
+    def _checkout_shared(self):
+        """Returns the shared single-image entry with its lock held, creating it on first use."""
+        with self._lock:
+            if self._shared is None:
+                self._shared = _PoseEntry(static_image_mode=True)
+            entry = self._shared
+        entry.lock.acquire()
+        return entry
+
+    @staticmethod
+    def _close(entry):
+        with entry.lock:
+            if entry.pose is not None:
+                entry.pose.close()
+                entry.pose = None
+
+
+pose_pool = PosePool()
 
 # --- The Upgraded Tracker with More Detailed State ---
 class ExerciseTracker:
+    __slots__ = (
+        "good_reps", "bad_reps", "uncertain_reps", "stage", "feedback", "angle",
+        "form_issue", "accuracy", "gemini_coach_tip", "last_rep_confidence",
+        "last_rep_form_ok", "total_reps", "is_new_rep",
+        "last_gemini_call_time", "gemini_processing", "temporal",
+    )
+
     def __init__(self):
         """Initializes the tracker's state."""
+        self.temporal = TemporalFilter()
         self.reset()
 
     def reset(self):
@@ -43,341 +449,93 @@ class ExerciseTracker:
         self.last_rep_form_ok = False
         self.total_reps = 0
         self.is_new_rep = False
+        self.last_gemini_call_time = 0.0
+        self.gemini_processing = False
+        self.temporal.reset()
 
 
 # --- Utility Functions ---
-def calculate_angle(a, b, c):
-    """Calculates the angle between three points."""
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-    angle = np.abs(radians * 180.0 / np.pi)
-    return angle if angle <= 180.0 else 360 - angle
-
-def calculate_confidence(landmarks, key_points):
-    """Calculates a confidence score based on the visibility of key landmarks."""
-    min_visibility = 1.0
-    for point in key_points:
-        visibility = landmarks[point.value].visibility
-        if visibility < min_visibility:
-            min_visibility = visibility
-    return min_visibility
-
-
-def get_gemini_coach_tip_async(image_bytes, prompt, tracker):
-    """Fetches a coaching tip from Gemini in a separate thread."""
-    if not gemini_model: 
-        tracker.gemini_processing = False
-        return
-    current_time = time.time()
-    if current_time - tracker.last_gemini_call_time < 10: # 10-second cooldown
-        tracker.gemini_processing = False
-        return
-    tracker.last_gemini_call_time = current_time
-    try:
-        image_part = {"mime_type": "image/jpeg", "data": image_bytes}
-        response = gemini_model.generate_content([prompt, image_part], stream=False)
-        response.resolve()
-        if response.text:
-            tracker.gemini_coach_tip = response.text
-    except Exception as e:
-        print(f"Error with Gemini API: {e}")
-        tracker.gemini_coach_tip = "Focus on your form."
-    finally:
-        tracker.gemini_processing = False
-
-### MODIFIED FUNCTIONS FOR PROBABILISTIC LOGIC ###
-def _process_squat(landmarks, tracker):
-    """Processes a squat with selective classification logic."""
-    # Define key landmarks for full-body visibility
-    key_landmarks = [
-        mp_pose.PoseLandmark.LEFT_HIP, mp_pose.PoseLandmark.RIGHT_HIP,
-        mp_pose.PoseLandmark.LEFT_KNEE, mp_pose.PoseLandmark.RIGHT_KNEE,
-        mp_pose.PoseLandmark.LEFT_ANKLE, mp_pose.PoseLandmark.RIGHT_ANKLE
-    ]
-
-    hip_l = [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y]
-    knee_l = [landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y]
-    ankle_l = [landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
-    shoulder_l = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-    
-    knee_angle = calculate_angle(hip_l, knee_l, ankle_l)
-    back_angle = calculate_angle(shoulder_l, hip_l, knee_l)
-    tracker.angle = knee_angle
-    
-    is_deep_enough = knee_angle < 110
-    is_standing = knee_angle > 160
-    is_back_straight = back_angle > 70
-    
-    tracker.is_new_rep = False
+def landmarks_to_array(pose_landmarks):
+    """Converts a MediaPipe landmark list into a contiguous (33, 4) float32 array of x, y, z, visibility."""
+    return np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark],
+        dtype=np.float32,
+    )
 
-    if is_deep_enough:
-        if tracker.stage in [None, 'up']:
-            tracker.stage = 'down'
-            tracker.feedback = "Go up!"
-            
-        tracker.last_rep_form_ok = is_back_straight
-        confidence = calculate_confidence(landmarks, key_landmarks)
-        tracker.last_rep_confidence = confidence
-        tracker.form_issue = "Keep Chest Up!" if not is_back_straight else None
-
-    elif is_standing and tracker.stage == 'down':
-        tracker.is_new_rep = True
-        tracker.stage = 'up'
-        
-        if tracker.last_rep_confidence < 0.75:
-            tracker.uncertain_reps += 1
-            tracker.feedback = "Uncertain (Bad Visibility)"
-        else:
-            if tracker.last_rep_form_ok:
-                tracker.good_reps += 1
-                tracker.feedback = "Good Rep!"
-            else:
-                tracker.bad_reps += 1
-                tracker.feedback = tracker.form_issue if tracker.form_issue else "Squat Deeper!"
-
-
-def _process_bicep_curl(landmarks, tracker):
-    """Processes a bicep curl with selective classification logic."""
-    shoulder_lm = mp_pose.PoseLandmark.LEFT_SHOULDER
-    elbow_lm = mp_pose.PoseLandmark.LEFT_ELBOW
-    wrist_lm = mp_pose.PoseLandmark.LEFT_WRIST
-    key_landmarks = [shoulder_lm, elbow_lm, wrist_lm]
-
-    shoulder = [landmarks[shoulder_lm.value].x, landmarks[shoulder_lm.value].y]
-    elbow = [landmarks[elbow_lm.value].x, landmarks[elbow_lm.value].y]
-    wrist = [landmarks[wrist_lm.value].x, landmarks[wrist_lm.value].y]
-    tracker.angle = calculate_angle(shoulder, elbow, wrist)
-    
-    is_curled = tracker.angle < 40
-    is_extended = tracker.angle > 150
-    CONFIDENCE_THRESHOLD = 0.75
-
-    tracker.is_new_rep = False
-
-    # At the peak of the curl, determine form and confidence
-    if is_curled and tracker.stage in [None, 'down']:
-        tracker.stage = 'up'
-        tracker.feedback = "Squeeze!"
-        
-        confidence = calculate_confidence(landmarks, key_landmarks)
-        tracker.last_rep_confidence = confidence
-        tracker.last_rep_form_ok = True
-
-    # After extending, judge the previous curl
-    elif is_extended and tracker.stage == 'up':
-        tracker.is_new_rep = True
-        tracker.stage = 'down'
-        
-        if tracker.last_rep_confidence < CONFIDENCE_THRESHOLD:
-            tracker.uncertain_reps += 1
-            tracker.feedback = "Uncertain (Bad Visibility)"
-        else:
-            if tracker.last_rep_form_ok:
-                tracker.good_reps += 1
-                tracker.feedback = "Good Curl!"
-            else:
-                tracker.bad_reps += 1
-                tracker.feedback = "Incomplete Rep!"
-        
-        # Reset for the next rep
-        tracker.last_rep_form_ok = False
-        tracker.last_rep_confidence = 1.0
-
-
-def _process_pushup(landmarks, tracker):
-    """Processes a pushup with selective classification logic."""
-    key_landmarks = [
-        mp_pose.PoseLandmark.LEFT_SHOULDER, mp_pose.PoseLandmark.RIGHT_SHOULDER,
-        mp_pose.PoseLandmark.LEFT_ELBOW, mp_pose.PoseLandmark.RIGHT_ELBOW,
-        mp_pose.PoseLandmark.LEFT_WRIST, mp_pose.PoseLandmark.RIGHT_WRIST,
-        mp_pose.PoseLandmark.LEFT_HIP, mp_pose.PoseLandmark.RIGHT_HIP
-    ]
-
-    shoulder = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-    elbow = [landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].y]
-    wrist = [landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].x, landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].y]
-    hip = [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y]
-    tracker.angle = calculate_angle(shoulder, elbow, wrist)
-    
-    # Form criteria
-    is_down = tracker.angle < 90
-    is_up = tracker.angle > 160
-    is_back_straight = hip[1] > shoulder[1] # Check if hips are not sagging
 
-    tracker.is_new_rep = False
-    
-    if is_down and tracker.stage in [None, 'up']:
-        tracker.stage = "down"
-        tracker.feedback = "Down"
-        tracker.last_rep_form_ok = is_back_straight
-        confidence = calculate_confidence(landmarks, key_landmarks)
-        tracker.last_rep_confidence = confidence
-
-    elif is_up and tracker.stage == 'down':
-        tracker.is_new_rep = True
-        tracker.stage = "up"
-        
-        if tracker.last_rep_confidence < 0.70:
-            tracker.uncertain_reps += 1
-            tracker.feedback = "Uncertain (Bad Visibility)"
-        else:
-            if tracker.last_rep_form_ok:
-                tracker.good_reps += 1
-                tracker.feedback = "Good Rep!"
-            else:
-                tracker.bad_reps += 1
-                tracker.feedback = "Keep a Straight Back!"
-        
-        tracker.last_rep_form_ok = False
-
-
-def _process_jumping_jack(landmarks, tracker):
-    """Processes a jumping jack with selective classification logic."""
-    # Define key landmarks for full-body visibility
-    key_landmarks = [
-        mp_pose.PoseLandmark.LEFT_SHOULDER, mp_pose.PoseLandmark.RIGHT_SHOULDER,
-        mp_pose.PoseLandmark.LEFT_WRIST, mp_pose.PoseLandmark.RIGHT_WRIST,
-        mp_pose.PoseLandmark.LEFT_ANKLE, mp_pose.PoseLandmark.RIGHT_ANKLE
-    ]
-    
-    # Get coordinates
-    shoulder_l = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y]
-    wrist_l = [landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].x, landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].y]
-    ankle_l = [landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
-    ankle_r = [landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].y]
-
-    # Form criteria
-    leg_separation = abs(ankle_l[0] - ankle_r[0])
-    arms_are_up = wrist_l[1] < shoulder_l[1] # Y-coordinate is smaller when higher
-    
-    is_out_position = leg_separation > 0.25 and arms_are_up
-    is_in_position = leg_separation < 0.15
-    CONFIDENCE_THRESHOLD = 0.70
-
-    tracker.is_new_rep = False
-
-    # At the peak "out" position, determine form and confidence
-    if tracker.stage in [None, 'in'] and is_out_position:
-        tracker.stage = "out"
-        tracker.feedback = "Out!"
-        
-        confidence = calculate_confidence(landmarks, key_landmarks)
-        tracker.last_rep_confidence = confidence
-        tracker.last_rep_form_ok = True
-
-    # After returning to "in" position, judge the previous jack
-    elif tracker.stage == 'out' and is_in_position:
-        tracker.is_new_rep = True
-        tracker.stage = 'in'
-        
-        if tracker.last_rep_confidence < CONFIDENCE_THRESHOLD:
-            tracker.uncertain_reps += 1
-            tracker.feedback = "Uncertain (Full Body Not Visible)"
+# --- Frame Decoding ---
+# OpenCV >= 4.10 can decode straight into RGB; older builds need one in-place swap.
+_IMREAD_COLOR_RGB = getattr(cv2, "IMREAD_COLOR_RGB", None)
+
+
+def decode_frame(img_bytes):
+    """Decodes JPEG/WebP bytes into the contiguous RGB array MediaPipe expects."""
+    with stage("decode"):
+        buffer = np.frombuffer(img_bytes, dtype=np.uint8)
+        if _IMREAD_COLOR_RGB is not None:
+            image_rgb = cv2.imdecode(buffer, _IMREAD_COLOR_RGB)
         else:
-            if tracker.last_rep_form_ok:
-                tracker.good_reps += 1
-                tracker.feedback = "Good Jack!"
-            else:
-                tracker.bad_reps += 1
-                tracker.feedback = "Incomplete Jack!"
-                
-        tracker.last_rep_form_ok = False
-        tracker.last_rep_confidence = 1.0
-
-
-def _process_lunge(landmarks, tracker):
-    """Processes a lunge with selective classification logic."""
-    key_landmarks = [
-        mp_pose.PoseLandmark.LEFT_HIP, mp_pose.PoseLandmark.RIGHT_HIP,
-        mp_pose.PoseLandmark.LEFT_KNEE, mp_pose.PoseLandmark.RIGHT_KNEE,
-        mp_pose.PoseLandmark.LEFT_ANKLE, mp_pose.PoseLandmark.RIGHT_ANKLE
-    ]
-
-    hip_l = [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y]
-    knee_l = [landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y]
-    ankle_l = [landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].y]
-    hip_r = [landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].y]
-    knee_r = [landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].y]
-    ankle_r = [landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].y]
-
-    left_knee_angle = calculate_angle(hip_l, knee_l, ankle_l)
-    right_knee_angle = calculate_angle(hip_r, knee_r, ankle_r)
-    tracker.angle = (left_knee_angle + right_knee_angle) / 2
-    
-    is_down_position = left_knee_angle < 110 and right_knee_angle < 110
-    is_up_position = left_knee_angle > 160 and right_knee_angle > 160
-    is_good_form = True # This would be a more complex check on torso and knee alignment
-    
-    tracker.is_new_rep = False
-    
-    if tracker.stage in [None, 'up'] and is_down_position:
-        tracker.stage = 'down'
-        tracker.feedback = 'Lunge Down'
-        confidence = calculate_confidence(landmarks, key_landmarks)
-        tracker.last_rep_confidence = confidence
-        tracker.last_rep_form_ok = is_good_form
-
-    elif tracker.stage == 'down' and is_up_position:
-        tracker.is_new_rep = True
-        tracker.stage = 'up'
-        
-        if tracker.last_rep_confidence < 0.70:
-            tracker.uncertain_reps += 1
-            tracker.feedback = "Uncertain (Bad Visibility)"
+            image_rgb = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            if image_rgb is not None:
+                cv2.cvtColor(image_rgb, cv2.COLOR_BGR2RGB, dst=image_rgb)
+        if image_rgb is None:
+            raise ValueError("Could not decode image data")
+    return image_rgb
+
+
+# --- Pose Estimation and Rules ---
+def detect_pose(image_rgb, session_key=None, ladder=None):
+    """Runs pose estimation and returns a (33, 4) landmark array, or None if nobody is in frame."""
+    with stage("pose"):
+        return pose_pool.detect(session_key, image_rgb, ladder)
+
+
+def analyze_landmarks(points, exercise_type, tracker, timestamp=None):
+    """Advances the tracker's state machine with one frame's (33, 4) landmark array.
+
+    ``timestamp`` is when the frame was captured, in seconds on any monotonic
+    clock; it defaults to now.
+    """
+    if points is None:
+        FRAMES.labels("no_person").inc()
+        tracker.feedback = "No person detected"
+        tracker.temporal.reset()
+        return tracker_summary(tracker)
+
+    try:
+        exercise = EXERCISES.get(exercise_type)
+        if exercise is None:
+            FRAMES.labels("unknown_exercise").inc()
+            tracker.feedback = f"'{exercise_type}' is not implemented."
         else:
-            if tracker.last_rep_form_ok:
-                tracker.good_reps += 1
-                tracker.feedback = "Up! Good Lunge."
-            else:
-                tracker.bad_reps += 1
-                tracker.feedback = "Maintain Your Balance!"
-                
-        tracker.last_rep_form_ok = False
-        tracker.last_rep_confidence = 1.0
-
-
-# --- Main Processing Function (Dispatcher) ---
-def process_frame(image, exercise_type, tracker):
-    """Processes a video frame to analyze exercise form and count reps."""
-    with mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = pose.process(image_rgb)
-        
-        try:
-            landmarks = results.pose_landmarks.landmark
+            with stage("rules"):
+                timestamp = time.monotonic() if timestamp is None else timestamp
+                flags, angle, confidence = exercise.evaluate(tracker.temporal.smooth(points, timestamp))
+                exercise.step(tracker, flags, angle, confidence)
+            FRAMES.labels("analyzed").inc()
             
-            # Dispatch to the correct exercise processor
-            if exercise_type == 'squat':
-                _process_squat(landmarks, tracker) 
-            elif exercise_type == 'bicep_curl':
-                _process_bicep_curl(landmarks, tracker)
-            elif exercise_type == 'pushup':
-                _process_pushup(landmarks, tracker)
-            elif exercise_type == 'jumping_jack':
-                _process_jumping_jack(landmarks, tracker)
-            elif exercise_type == 'lunge':
-                _process_lunge(landmarks, tracker)
-            else:
-                tracker.feedback = f"'{exercise_type}' is not implemented."
-                
-        except AttributeError:
-            tracker.feedback = "No person detected"
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            tracker.feedback = "Error detecting pose"
-        
-        total_judged_reps = tracker.good_reps + tracker.bad_reps
-        if total_judged_reps > 0:
-            tracker.accuracy = (tracker.good_reps / total_judged_reps) * 100
-        else:
-            tracker.accuracy = 0
-        
-        return {
-            "good_reps": tracker.good_reps,
-            "bad_reps": tracker.bad_reps,
-            "uncertain_reps": tracker.uncertain_reps,
-            "feedback": tracker.feedback,
-            "angle": round(tracker.angle, 2),
-            "gemini_feedback": tracker.gemini_coach_tip,
-            "accuracy": round(tracker.accuracy, 1)
-        }
\ No newline at end of file
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        FRAMES.labels("error").inc()
+        tracker.feedback = "Error detecting pose"
+
+    return tracker_summary(tracker)
+
+
+def tracker_summary(tracker):
+    """Builds the API response for the tracker's current state."""
+    total_judged_reps = tracker.good_reps + tracker.bad_reps
+    if total_judged_reps > 0:
+        tracker.accuracy = (tracker.good_reps / total_judged_reps) * 100
+    else:
+        tracker.accuracy = 0
+    
+    return {
+        "good_reps": tracker.good_reps,
+        "bad_reps": tracker.bad_reps,
+        "uncertain_reps": tracker.uncertain_reps,
+        "feedback": tracker.feedback,
+        "angle": round(tracker.angle, 2),
+        "gemini_feedback": tracker.gemini_coach_tip,
+        "accuracy": round(tracker.accuracy, 1)
+    }
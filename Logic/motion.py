@@ -0,0 +1,71 @@
+import os
+
+import cv2
+import numpy as np
+
+# --- Motion Gate Configuration ---
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.5"))  # percent of thumbnail pixels that must change
+MOTION_PIXEL_DELTA = 12  # gray levels a pixel must change by to count as changed
+MOTION_MAX_SKIPPED = int(os.getenv("MOTION_MAX_SKIPPED", "5"))  # still frames in a row before inference is forced
+CAPTURE_INTERVAL_ACTIVE_MS = int(os.getenv("CAPTURE_INTERVAL_ACTIVE_MS", "150"))  # mid-rep
+CAPTURE_INTERVAL_MOVING_MS = int(os.getenv("CAPTURE_INTERVAL_MOVING_MS", "200"))
+CAPTURE_INTERVAL_IDLE_MS = int(os.getenv("CAPTURE_INTERVAL_IDLE_MS", "500"))  # resting between sets
+THUMBNAIL_SIZE = (64, 48)
+
+
+def motion_thumbnail(img_bytes):
+    """Decodes a frame straight to a tiny grayscale thumbnail for frame differencing.
+
+    JPEG decoders can scale by 1/8 during the DCT, so this costs a fraction
+    of a full decode. Raises ValueError if the image cannot be decoded.
+    """
+    image = cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        raise ValueError("Could not decode image data")
+    thumbnail = cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    # A light blur keeps sensor noise from reading as movement.
+    return cv2.GaussianBlur(thumbnail, (3, 3), 0)
+
+
+class MotionGate:
+    """Decides per session whether a frame changed enough to be worth running pose inference on.
+
+    Each frame is compared with the last frame that was actually analyzed,
+    so slow movements still add up to a trigger. At most ``max_skipped``
+    frames in a row are skipped, which bounds how stale a result can get.
+    """
+    __slots__ = ("threshold", "max_skipped", "reference", "skipped", "score")
+
+    def __init__(self, threshold=MOTION_THRESHOLD, max_skipped=MOTION_MAX_SKIPPED):
+        self.threshold = threshold
+        self.max_skipped = max_skipped
+        self.reference = None
+        self.skipped = 0
+        self.score = float("inf")
+
+    def should_skip(self, thumbnail):
+        """Returns True if ``thumbnail`` is too similar to the last analyzed frame."""
+        if self.reference is None or self.reference.shape != thumbnail.shape:
+            self.score = float("inf")
+            return False
+        # Counting changed pixels, rather than averaging the difference, keeps a
+        # forearm moving in a corner of the frame from being diluted away.
+        changed = cv2.countNonZero(cv2.threshold(cv2.absdiff(thumbnail, self.reference), MOTION_PIXEL_DELTA, 255, cv2.THRESH_BINARY)[1])
+        self.score = 100.0 * changed / thumbnail.size
+        if self.score >= self.threshold or self.skipped >= self.max_skipped:
+            return False
+        self.skipped += 1
+        return True
+
+    def analyzed(self, thumbnail):
+        """Makes ``thumbnail`` the reference for the following frames."""
+        self.reference = thumbnail
+        self.skipped = 0
+
+    def next_interval_ms(self, mid_rep):
+        """Suggests how long the client should wait before sending its next frame."""
+        if mid_rep:
+            return CAPTURE_INTERVAL_ACTIVE_MS
+        if self.score >= self.threshold:
+            return CAPTURE_INTERVAL_MOVING_MS
+        return CAPTURE_INTERVAL_IDLE_MS
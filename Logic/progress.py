@@ -0,0 +1,165 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# --- Progress Rollups ---
+# One document per (user, exercise, period, period start) holding running totals,
+# so charts read a handful of buckets instead of the whole history. Each bucket
+# also lists the workout ids it has counted, so applying a workout twice is a no-op.
+PERIODS = ("day", "week")
+MAX_SUMMARY_BUCKETS = 366
+ROLLUP_KEY = ("user_id", "exercise_type", "period", "start")
+ROLLUP_INDEX = [("user_id", 1), ("exercise_type", 1), ("period", 1), ("start", -1)]
+BACKFILL_BATCH = 500
+DUPLICATE_KEY = 11000
+
+
+def ensure_rollup_index(collection):
+    """Creates the unique index that both identifies and serves rollup buckets."""
+    collection.create_index(ROLLUP_INDEX, name="user_rollups", unique=True)
+
+
+def period_start(timestamp, period):
+    """Returns the UTC start of the day, or of the Monday-based week, containing ``timestamp``."""
+    day = datetime(timestamp.year, timestamp.month, timestamp.day)
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown period '{period}'")
+
+
+def _totals(workout):
+    reps = workout.get("rep_count") or 0
+    accuracy = float(workout.get("average_accuracy") or 0)
+    return {
+        "sessions": 1,
+        "total_reps": reps,
+        "duration_seconds": workout.get("duration_seconds") or 0,
+        # Accuracy is weighted by reps so a 2-rep set cannot outweigh a 50-rep one.
+        "accuracy_weighted_sum": accuracy * reps,
+    }
+
+
+def rollup_updates(workout):
+    """Yields (bucket key, totals) for every period a workout counts towards."""
+    totals = _totals(workout)
+    for period in PERIODS:
+        key = {
+            "user_id": workout["user_id"],
+            "exercise_type": workout["exercise_type"],
+            "period": period,
+            "start": period_start(workout["completion_timestamp"], period),
+        }
+        yield key, totals
+
+
+def apply_rollups(collection, workouts):
+    """Adds saved workouts to their day and week buckets with one unordered bulk upsert.
+
+    Safe to repeat: a bucket that already lists a workout's _id does not
+    match its update, so the upsert collides with the unique bucket index
+    instead of counting the workout again, and that collision is ignored.
+    """
+    operations = [
+        UpdateOne(
+            dict(key, workout_ids={"$ne": workout["_id"]}),
+            {"$inc": totals, "$addToSet": {"workout_ids": workout["_id"]}},
+            upsert=True,
+        )
+        for workout in workouts
+        for key, totals in rollup_updates(workout)
+    ]
+    if not operations:
+        return
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+
+
+def _accumulate(buckets, workout):
+    for key, totals in rollup_updates(workout):
+        bucket_id = tuple(key[field] for field in ROLLUP_KEY)
+        bucket = buckets.get(bucket_id)
+        if bucket is None:
+            buckets[bucket_id] = dict(key, **totals, workout_ids=[workout["_id"]])
+        else:
+            for field, value in totals.items():
+                bucket[field] += value
+            bucket["workout_ids"].append(workout["_id"])
+
+
+def backfill_rollups(workouts, rollups, user_id=None):
+    """Rebuilds rollups from the workouts collection and returns the number of buckets written.
+
+    Workouts are read in user_id order (served by the history index) and
+    each bucket is replaced with its recomputed totals, so the job can be
+    re-run safely and memory stays bounded by one user's buckets. Saves that
+    land while it runs may be counted twice; run it before deploying the
+    incremental updates or in a quiet window.
+    """
+    query = {"user_id": user_id} if user_id else {}
+    fields = {"_id": 1, "user_id": 1, "exercise_type": 1, "rep_count": 1,
+              "duration_seconds": 1, "average_accuracy": 1, "completion_timestamp": 1}
+    buckets, current_user, written = {}, None, 0
+
+    def flush():
+        operations = [
+            ReplaceOne({field: bucket[field] for field in ROLLUP_KEY}, bucket, upsert=True)
+            for bucket in buckets.values()
+        ]
+        for start in range(0, len(operations), BACKFILL_BATCH):
+            rollups.bulk_write(operations[start:start + BACKFILL_BATCH], ordered=False)
+        buckets.clear()
+        return len(operations)
+
+    for workout in workouts.find(query, fields).sort("user_id", 1):
+        if not workout.get("exercise_type") or not workout.get("completion_timestamp"):
+            continue
+        if workout["user_id"] != current_user:
+            written += flush()
+            current_user = workout["user_id"]
+        _accumulate(buckets, workout)
+    return written + flush()
+
+
+def get_summary(rollups, user_id, exercise_type, period="day", limit=30):
+    """Returns the most recent ``limit`` buckets, oldest first, with accuracy resolved and ISO start dates."""
+    cursor = rollups.find(
+        {"user_id": user_id, "exercise_type": exercise_type, "period": period},
+        {"_id": 0, "user_id": 0, "exercise_type": 0, "period": 0, "workout_ids": 0},
+    ).sort("start", -1).limit(limit)
+    buckets = []
+    for bucket in cursor:
+        weighted = bucket.pop("accuracy_weighted_sum", 0)
+        reps = bucket.get("total_reps", 0)
+        bucket["average_accuracy"] = round(weighted / reps, 1) if reps else 0
+        bucket["start"] = bucket["start"].date().isoformat()
+        buckets.append(bucket)
+    buckets.reverse()
+    return buckets
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Rebuild progress rollups from saved workouts.")
+    parser.add_argument("--user", help="only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.environ.get("MONGO_URI")).get_database("replicai_db")
+    rollups = db.get_collection("progress_rollups")
+    ensure_rollup_index(rollups)
+    written = backfill_rollups(db.get_collection("workouts"), rollups, args.user)
+    print(f"✅ Rebuilt {written} progress rollup bucket(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from exercises import LANDMARK_NAMES, CompiledExercise, RepScorer
+
+# --- Session Recording Configuration ---
+# Recording is off unless RECORDINGS_DIR is set.
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", "")
+RECORDING_CHUNK_FRAMES = int(os.getenv("RECORDING_CHUNK_FRAMES", "32"))  # frames buffered before each append
+RECORDING_RETENTION_DAYS = float(os.getenv("RECORDING_RETENTION_DAYS", "30"))  # 0 keeps recordings forever
+RESCORE_BATCH_FRAMES = 8192
+RECORDING_MAGIC = b"RPLREC01"
+HEADER_SIZE = 256  # magic plus a space-padded JSON header, so frames start at a fixed offset
+FRAME_DTYPE = np.dtype([("t", "<f8"), ("points", "<f2", (len(LANDMARK_NAMES), 4))])
+RECORDING_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,80}$")
+# Spec keys that may be overridden when re-scoring; everything else is fixed by the recording.
+RESCORABLE_KEYS = ("enter", "exit", "form", "confidence_threshold", "sample_while_held", "reset_after_rep")
+
+
+def recording_path(user_id, recording_id, root=RECORDINGS_DIR):
+    """Returns where a user's recording lives; raises ValueError for unsafe ids."""
+    if not RECORDING_ID_PATTERN.match(str(recording_id)):
+        raise ValueError("Invalid recording id")
+    # Auth0 subs contain characters like '|', so users get a hashed directory name.
+    user_dir = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:24]
+    return os.path.join(root, user_dir, f"{recording_id}.rec")
+
+
+def new_recording_id(session_id):
+    """Returns a fresh recording id for a session; a reused session id never reuses a recording."""
+    return f"{session_id}-{secrets.token_hex(4)}"
+
+
+class SessionRecorder:
+    """Appends one session's landmark stream to a compact binary recording.
+
+    Each frame is a float64 timestamp (seconds since the first frame) and the
+    (33, 4) landmarks as float16, 272 bytes in all; frames with nobody in
+    them are stored as NaN. Frames are buffered and appended
+    ``chunk_frames`` at a time, and the file is only created once the first
+    chunk is written, and never over an existing file. A torn final frame is
+    ignored when reading.
+    """
+
+    def __init__(self, path, exercise_type, chunk_frames=RECORDING_CHUNK_FRAMES):
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self.exercise_type = exercise_type
+        self.chunk_frames = chunk_frames
+        self._buffer = np.empty(chunk_frames, dtype=FRAME_DTYPE)
+        self._buffered = 0
+        self._origin = None
+        self._created = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, points):
+        """Buffers one frame; ``points`` is a (33, 4) array or None if nobody was detected."""
+        with self._lock:
+            if self._closed:
+                return
+            if self._origin is None:
+                self._origin = timestamp
+            self._buffer["t"][self._buffered] = timestamp - self._origin
+            self._buffer["points"][self._buffered] = np.nan if points is None else points
+            self._buffered += 1
+            if self._buffered == self.chunk_frames:
+                self._write()
+
+    def flush(self):
+        """Appends whatever is buffered."""
+        with self._lock:
+            self._write()
+
+    def close(self):
+        """Flushes and stops recording; later frames are ignored."""
+        with self._lock:
+            self._write()
+            self._closed = True
+
+    def _write(self):
+        if not self._buffered:
+            return
+        try:
+            if not self._created:
+                self._create()
+            with open(self.path, "ab") as f:
+                f.write(self._buffer[:self._buffered].tobytes())
+        except OSError as e:
+            print(f"❌ Error writing session recording {self.path}: {e}")
+        self._buffered = 0
+
+    def _create(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        header = json.dumps({
+            "exercise": self.exercise_type,
+            "started_at": datetime.utcnow().isoformat() + "Z",
+            "frame_dtype": FRAME_DTYPE.descr,
+        }).encode("utf-8")
+        if len(RECORDING_MAGIC) + len(header) > HEADER_SIZE:
+            raise ValueError("Recording header is too large")
+        with open(self.path, "xb") as f:
+            f.write(RECORDING_MAGIC + header.ljust(HEADER_SIZE - len(RECORDING_MAGIC)))
+        self._created = True
+
+
+class Recording:
+    """A recording opened read-only through a memory map; nothing is read until it is used."""
+
+    def __init__(self, path):
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            size = f.seek(0, os.SEEK_END)
+        if len(header) < HEADER_SIZE or not header.startswith(RECORDING_MAGIC):
+            raise ValueError(f"'{path}' is not a session recording")
+        self.meta = json.loads(header[len(RECORDING_MAGIC):].decode("utf-8"))
+        self.exercise_type = self.meta["exercise"]
+        count = (size - HEADER_SIZE) // FRAME_DTYPE.itemsize
+        if count:
+            self.frames = np.memmap(path, dtype=FRAME_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.frames = np.empty(0, dtype=FRAME_DTYPE)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def timestamps(self):
+        return self.frames["t"]
+
+    @property
+    def points(self):
+        return self.frames["points"]
+
+
+def list_recordings(user_id=None, exercise_type=None, root=RECORDINGS_DIR):
+    """Returns recordings, newest first, optionally limited to one user and exercise."""
+    pattern = os.path.join(os.path.dirname(recording_path(user_id, "x", root)) if user_id else os.path.join(root, "*"), "*.rec")
+    recordings = []
+    for path in sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True):
+        try:
+            recording = Recording(path)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Skipping unreadable recording {path}: {e}")
+            continue
+        if exercise_type is None or recording.exercise_type == exercise_type:
+            recordings.append(recording)
+    return recordings
+
+
+def prune_recordings(max_age_days=RECORDING_RETENTION_DAYS, root=RECORDINGS_DIR):
+    """Deletes recordings last written more than ``max_age_days`` ago; returns how many went."""
+    if not root or max_age_days <= 0:
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for path in glob.glob(os.path.join(root, "*", "*.rec")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"WARNING: Could not prune recording {path}: {e}")
+    for user_dir in glob.glob(os.path.join(root, "*", "")):
+        try:
+            os.rmdir(user_dir)  # only succeeds once the directory is empty
+        except OSError:
+            pass
+    return removed
+
+
+def compile_overrides(exercise, overrides):
+    """Compiles ``exercise`` with some of its rules replaced; raises ValueError for bad overrides."""
+    if not overrides:
+        return exercise
+    if not isinstance(overrides, dict):
+        raise ValueError("overrides must be an object")
+    unknown = set(overrides) - set(RESCORABLE_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot override {', '.join(sorted(unknown))}; allowed: {', '.join(RESCORABLE_KEYS)}")
+    try:
+        return CompiledExercise(exercise.name, dict(exercise.spec, **overrides))
+    except (TypeError, KeyError) as e:
+        raise ValueError(f"Invalid overrides: {e}") from None
+
+
+def rescore(recordings, exercise, include_reps=False):
+    """Replays recordings through ``exercise`` and returns one summary per recording.
+
+    Only the state machine runs: landmarks come straight from the memory
+    map in batches of RESCORE_BATCH_FRAMES, already smoothed the way the
+    live tracker saw them, so nothing touches the pose model.
+    """
+    from ml import ExerciseTracker
+
+    results = []
+    for recording in recordings:
+        scorer = RepScorer(exercise, ExerciseTracker())
+        for start in range(0, len(recording), RESCORE_BATCH_FRAMES):
+            batch = recording.frames[start:start + RESCORE_BATCH_FRAMES]
+            scorer.feed(batch["t"], batch["points"].astype(np.float32))
+        summary = scorer.summary()
+        if not include_reps:
+            del summary["reps"]
+        summary["recording_id"] = recording.id
+        summary["started_at"] = recording.meta.get("started_at")
+        results.append(summary)
+    return results
+
+
+def main():
+    from ml import EXERCISES
+
+    parser = argparse.ArgumentParser(description="Re-score recorded sessions with changed exercise rules.")
+    parser.add_argument("--exercise", help="exercise type, e.g. squat")
+    parser.add_argument("--overrides", default="{}", help='JSON spec overrides, e.g. \'{"enter": [["knee", "<", 115]]}\'')
+    parser.add_argument("--user", help="only re-score this user's recordings")
+    parser.add_argument("--reps", action="store_true", help="include every rep in the output")
+    parser.add_argument("--prune", action="store_true", help="delete recordings older than RECORDING_RETENTION_DAYS and exit")
+    args = parser.parse_args()
+
+    if args.prune:
+        print(f"✅ Pruned {prune_recordings()} recording(s) older than {RECORDING_RETENTION_DAYS:g} days.")
+        return
+    if not args.exercise:
+        parser.error("--exercise is required")
+
+    if args.exercise not in EXERCISES:
+        parser.error(f"'{args.exercise}' is not implemented.")
+    exercise = compile_overrides(EXERCISES[args.exercise], json.loads(args.overrides))
+    recordings = list_recordings(args.user, args.exercise)
+    started = time.perf_counter()
+    results = rescore(recordings, exercise, args.reps)
+    elapsed = time.perf_counter() - started
+    print(json.dumps(results, indent=2))
+    frames = sum(result["frames_scored"] for result in results)
+    print(f"✅ Re-scored {len(results)} recording(s), {frames} frames, in {elapsed:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from ml import ExerciseTracker
+from motion import MotionGate
+
+# --- Session Registry Configuration ---
+DEFAULT_SESSION_ID = "default"
+MAX_SESSION_ID_LENGTH = 64
+
+
+class Session:
+    """A single workout session: its tracker plus the lock serializing its frames."""
+    __slots__ = ("tracker", "gate", "recorder", "lock", "last_seen", "frames_received", "frames_applied")
+
+    def __init__(self):
+        self.tracker = ExerciseTracker()
+        self.gate = MotionGate()
+        self.recorder = None  # created with the first analyzed frame
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        # Sequence numbers keep a slow, older frame from overwriting a newer result.
+        self.frames_received = 0
+        self.frames_applied = 0
+
+    def close(self):
+        """Writes out what the session still has buffered."""
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+class _Shard:
+    __slots__ = ("lock", "sessions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+
+
+class SessionRegistry:
+    """Thread-safe registry of workout sessions keyed by (Auth0 sub, session id).
+
+    Keys are spread over independently locked shards so requests for different
+    users never contend on one lock. Each shard is an LRU ordered by last
+    access: sessions idle for longer than ``ttl`` seconds are dropped, and the
+    oldest session is evicted once a shard is full, which bounds the total
+    number of live trackers to roughly ``max_sessions``.
+    """
+
+    def __init__(self, max_sessions=1024, ttl=1800, shards=16, on_evict=None):
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._shard_capacity = max(1, -(-max_sessions // shards))
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def reset(self, user_id, session_id=DEFAULT_SESSION_ID):
+        """Starts a fresh session, replacing any existing one with the same key."""
+        key = (user_id, session_id)
+        shard = self._shard_for(key)
+        with shard.lock:
+            old = shard.sessions.pop(key, None)
+            session = Session()
+            evicted = self._insert(shard, key, session)
+        if old is not None:
+            evicted.append((key, old))
+        self._notify(evicted)
+        return session
+
+    def get_or_create(self, user_id, session_id=DEFAULT_SESSION_ID):
+        """Returns the live session for a key, creating one if it is missing or expired."""
+        key = (user_id, session_id)
+        shard = self._shard_for(key)
+        now = time.monotonic()
+        with shard.lock:
+            session = shard.sessions.get(key)
+            if session is not None and now - session.last_seen <= self.ttl:
+                session.last_seen = now
+                shard.sessions.move_to_end(key)
+                return session
+            expired = []
+            if session is not None:
+                del shard.sessions[key]
+                expired.append((key, session))
+            session = Session()
+            evicted = self._insert(shard, key, session)
+        self._notify(expired + evicted)
+        return session
+
+    def discard(self, user_id, session_id=DEFAULT_SESSION_ID):
+        """Drops a session and returns it, or None if there was none."""
+        key = (user_id, session_id)
+        shard = self._shard_for(key)
+        with shard.lock:
+            removed = shard.sessions.pop(key, None)
+        if removed is not None:
+            self._notify([(key, removed)])
+        return removed
+
+    def __len__(self):
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def _shard_for(self, key):
+        user_id, session_id = key
+        digest = zlib.crc32(f"{user_id}\x00{session_id}".encode("utf-8"))
+        return self._shards[digest % len(self._shards)]
+
+    def _insert(self, shard, key, session):
+        """Adds a session to a locked shard and returns the (key, session) pairs it pushed out."""
+        evicted = []
+        cutoff = time.monotonic() - self.ttl
+        sessions = shard.sessions
+        # Least recently used sessions sit at the front, so expired ones do too.
+        while sessions:
+            oldest_key, oldest = next(iter(sessions.items()))
+            if oldest.last_seen >= cutoff and len(sessions) < self._shard_capacity:
+                break
+            del sessions[oldest_key]
+            evicted.append((oldest_key, oldest))
+        sessions[key] = session
+        return evicted
+
+    def _notify(self, removed):
+        for key, session in removed:
+            try:
+                session.close()
+                if self.on_evict is not None:
+                    self.on_evict(key)
+            except Exception as e:
+                print(f"❌ Error releasing session {key}: {e}")
+
+
+def normalize_session_id(session_id):
+    """Validates a client-supplied session id, falling back to the default one."""
+    if not session_id:
+        return DEFAULT_SESSION_ID
+    session_id = str(session_id)
+    if len(session_id) > MAX_SESSION_ID_LENGTH:
+        raise ValueError("session_id is too long")
+    return session_id
@@ -0,0 +1,45 @@
+import threading
+
+
+class LatestFrameSlot:
+    """A single-slot mailbox that always holds the newest frame.
+
+    Producers never block: putting a frame while an older one is still
+    waiting replaces it and counts the older frame as dropped. This keeps a
+    slow consumer working on fresh input instead of a growing backlog.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Stores a frame, replacing any unconsumed one. Returns False once closed."""
+        with self._cond:
+            if self._closed:
+                return False
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Waits for the next frame. Returns None on timeout or after close."""
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        """Wakes any waiting consumer and rejects further frames."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
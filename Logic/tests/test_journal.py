@@ -0,0 +1,167 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import WorkoutJournal  # noqa: E402
+from progress import ROLLUP_KEY, apply_rollups  # noqa: E402
+
+
+class FakeCollection:
+    """An in-memory collection that enforces a unique index like Mongo does.
+
+    ``lose_next_ack`` makes the next write land and then raise as if the
+    acknowledgement was lost, ``fail_next`` raises before writing anything,
+    and ``reject_once`` fails the inserts of those _ids a single time.
+    """
+
+    def __init__(self, unique=("_id",)):
+        self.documents = []
+        self.unique = unique
+        self.lose_next_ack = 0
+        self.fail_next = None
+        self.reject_once = set()
+
+    def create_index(self, keys, **kwargs):
+        return kwargs.get("name")
+
+    def insert_many(self, documents, ordered=True):
+        self._before_write()
+        errors = []
+        for index, document in enumerate(documents):
+            if document["_id"] in self.reject_once:
+                self.reject_once.discard(document["_id"])
+                errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+            elif self._conflicts(document):
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+            else:
+                self.documents.append(dict(document))
+        self._after_write(errors)
+
+    def bulk_write(self, operations, ordered=True):
+        self._before_write()
+        errors = []
+        for index, operation in enumerate(operations):
+            spec, update = operation._filter, operation._doc
+            document = next((d for d in self.documents if _matches(d, spec)), None)
+            if document is None:
+                document = {field: value for field, value in spec.items() if not isinstance(value, dict)}
+                if self._conflicts(document):
+                    errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+                    continue
+                document.update(update.get("$setOnInsert", {}))
+                self.documents.append(document)
+            for field, amount in update.get("$inc", {}).items():
+                document[field] = document.get(field, 0) + amount
+            for field, value in update.get("$addToSet", {}).items():
+                values = document.setdefault(field, [])
+                if value not in values:
+                    values.append(value)
+        self._after_write(errors)
+
+    def find_one(self, spec):
+        return next((d for d in self.documents if _matches(d, spec)), None)
+
+    def _conflicts(self, document):
+        key = tuple(document.get(field) for field in self.unique)
+        return any(tuple(d.get(field) for field in self.unique) == key for d in self.documents)
+
+    def _before_write(self):
+        if self.fail_next is not None:
+            error, self.fail_next = self.fail_next, None
+            raise error
+
+    def _after_write(self, errors):
+        if self.lose_next_ack:
+            self.lose_next_ack -= 1
+            raise AutoReconnect("connection closed before the reply")
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def _matches(document, spec):
+    for field, expected in spec.items():
+        if isinstance(expected, dict) and "$ne" in expected:
+            if expected["$ne"] in document.get(field, []):
+                return False
+        elif document.get(field) != expected:
+            return False
+    return True
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    # Flushes are driven by the test, not the background thread.
+    monkeypatch.setattr(WorkoutJournal, "_run", lambda self: None)
+    journal = WorkoutJournal(FakeCollection(), FakeCollection(), FakeCollection(unique=ROLLUP_KEY),
+                             path=str(tmp_path / "journal.jsonl"))
+    yield journal
+    journal.close()
+
+
+def workout(reps=10):
+    return {
+        "user_id": "auth0|user",
+        "exercise_type": "squat",
+        "rep_count": reps,
+        "duration_seconds": 60,
+        "average_accuracy": 90.0,
+        "completion_timestamp": datetime(2026, 10, 14, 9, 30),
+    }
+
+
+def bucket(rollups, period):
+    return rollups.find_one({"period": period, "user_id": "auth0|user", "exercise_type": "squat"})
+
+
+def test_lost_acknowledgement_still_rolls_up(journal):
+    journal.workouts.lose_next_ack = 1
+    journal.append(workout())
+
+    assert not journal.flush()  # stored, but the insert looked like it failed
+    assert journal.flush()  # the retry sees a duplicate key
+
+    assert len(journal.workouts.documents) == 1
+    for period in ("day", "week"):
+        assert bucket(journal.rollups, period)["sessions"] == 1
+    assert len(journal) == 0
+
+
+def test_failed_rollup_is_retried_without_double_counting(journal):
+    journal.rollups.fail_next = AutoReconnect("primary stepped down")
+    journal.append(workout())
+
+    assert not journal.flush()
+    assert len(journal) == 1  # kept pending until its rollups land
+    assert journal.flush()
+
+    assert len(journal.workouts.documents) == 1
+    assert bucket(journal.rollups, "day")["sessions"] == 1
+
+
+def test_partial_batch_failure_rolls_up_every_workout_once(journal):
+    journal.append(workout(reps=10))
+    journal.workouts.reject_once.add(journal.append(workout(reps=5)))
+
+    assert not journal.flush()
+    assert journal.flush()
+
+    assert len(journal.workouts.documents) == 2
+    day = bucket(journal.rollups, "day")
+    assert day["sessions"] == 2
+    assert day["total_reps"] == 15
+
+
+def test_applying_rollups_twice_counts_once(journal):
+    journal.append(workout())
+    assert journal.flush()
+    saved = journal.workouts.documents[0]
+
+    apply_rollups(journal.rollups, [saved])
+
+    assert bucket(journal.rollups, "week")["sessions"] == 1
+    assert bucket(journal.rollups, "week")["workout_ids"] == [saved["_id"]]
@@ -0,0 +1,108 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ml  # noqa: E402
+
+
+class FakePose:
+    """Stands in for a MediaPipe Pose graph and remembers how it was built."""
+
+    def __init__(self, static_image_mode=False):
+        self.static_image_mode = static_image_mode
+        self.frames = 0
+        self.last_image = None
+        self.closed = False
+
+    def process(self, image):
+        self.frames += 1
+        self.last_image = image
+        return SimpleNamespace(pose_landmarks=None)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def graphs(monkeypatch):
+    built = []
+
+    def create_pose(static_image_mode=False):
+        built.append(FakePose(static_image_mode))
+        return built[-1]
+
+    monkeypatch.setattr(ml, "create_pose", create_pose)
+    return built
+
+
+FRAME = np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+def test_full_pool_serves_extra_sessions_without_evicting_live_ones(graphs):
+    pool = ml.PosePool(max_size=2, spares=0)
+    for _ in range(10):
+        for session in ("a", "b", "c"):
+            pool.detect(session, FRAME)
+
+    tracking = [graph for graph in graphs if not graph.static_image_mode]
+    shared = [graph for graph in graphs if graph.static_image_mode]
+    assert len(tracking) == 2 and len(shared) == 1
+    assert not any(graph.closed for graph in graphs)
+    assert [graph.frames for graph in tracking] == [10, 10]
+    assert shared[0].frames == 10
+    pool.close()
+
+
+def test_overflow_session_gets_a_slot_once_one_goes_idle(graphs):
+    pool = ml.PosePool(max_size=1, idle_timeout=60, spares=0)
+    pool.detect("a", FRAME)
+    pool.detect("b", FRAME)
+    assert len(pool) == 1 and ("b" not in pool._entries)
+
+    pool._entries["a"].last_used -= 120
+    pool.detect("b", FRAME)
+
+    assert list(pool._entries) == ["b"]
+    assert graphs[0].closed
+    pool.close()
+
+
+def test_region_tracking_is_off_by_default(graphs):
+    pool = ml.PosePool(spares=0)
+    pool.detect("a", FRAME)
+    assert graphs[0].last_image is FRAME
+    pool.close()
+
+
+def test_region_crop_maps_landmarks_back_to_the_full_frame():
+    pytest.importorskip("mediapipe")
+    from bench import render_fixture_frames
+
+    frame = ml.decode_frame(render_fixture_frames("squat", count=1)[0])
+    height, width = frame.shape[:2]
+    # Put the figure off-centre in a larger frame, so the crop is much smaller than the image.
+    canvas = np.full((height * 2, width * 2, 3), (200, 210, 220), np.uint8)
+    canvas[height // 2:height // 2 + height, width:] = frame
+    ladder = (256, 384, 512)
+
+    full = ml._PoseEntry(static_image_mode=True)
+    cropped = ml._PoseEntry(static_image_mode=True)
+    try:
+        reference = ml.landmarks_to_array(full.pose.process(canvas).pose_landmarks)
+        cropped.region.update(reference, canvas.shape[1], canvas.shape[0], ladder)
+        x0, y0, x1, y1 = cropped.region.roi
+        assert (x1 - x0) * (y1 - y0) < 0.5
+
+        points = ml.PosePool._detect_region(cropped, canvas, ladder)
+    finally:
+        ml.PosePool._close(full)
+        ml.PosePool._close(cropped)
+
+    visible = reference[:, 3] > 0.5
+    assert visible.sum() >= 20
+    assert np.abs(points[visible, :2] - reference[visible, :2]).max() < 0.02
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ml  # noqa: E402
+from exercises import LANDMARK_INDEX as L, RepScorer  # noqa: E402
+
+# A shallow squat whose bottom is abrupt: the knee never gets below the 110 degree threshold.
+SHALLOW_SQUAT = [170, 150, 112, 111, 112, 170, 170]
+FRAME_SPACING = 0.2
+
+
+def squat_frame(knee_angle):
+    """A side-on squat pose with the left knee at ``knee_angle`` and an upright back."""
+    points = np.zeros((33, 4), dtype=np.float32)
+    points[:, 3] = 1.0
+    knee = np.array([0.5, 0.7])
+    ankle = knee + (0.0, 0.17)
+    theta = np.radians(knee_angle)
+    # Rotate the knee->ankle direction (0, 1) by the knee angle to place the hip.
+    hip = knee + 0.17 * np.array([-np.sin(theta), np.cos(theta)])
+    shoulder = hip + (0.0, -0.25)
+    for name, position in (("HIP", hip), ("KNEE", knee), ("ANKLE", ankle), ("SHOULDER", shoulder)):
+        for side in ("LEFT", "RIGHT"):
+            points[L[f"{side}_{name}"], :2] = position
+    return points
+
+
+def test_squat_frame_has_the_requested_angle():
+    squat = ml.EXERCISES["squat"]
+    features = squat.features(squat_frame(112.0)[np.newaxis])
+    assert abs(features[0, squat.feature_names.index("knee")] - 112.0) < 0.1
+
+
+def test_live_tracker_does_not_count_a_shallow_rep():
+    tracker = ml.ExerciseTracker()
+    for index, angle in enumerate(SHALLOW_SQUAT):
+        ml.analyze_landmarks(squat_frame(angle), "squat", tracker, index * FRAME_SPACING)
+    assert (tracker.good_reps, tracker.bad_reps, tracker.uncertain_reps) == (0, 0, 0)
+
+
+def test_rescoring_does_not_count_a_shallow_rep():
+    scorer = RepScorer(ml.EXERCISES["squat"], ml.ExerciseTracker())
+    timestamps = np.arange(len(SHALLOW_SQUAT)) * FRAME_SPACING
+    scorer.feed(timestamps, np.stack([squat_frame(angle) for angle in SHALLOW_SQUAT]))
+    assert scorer.summary()["reps"] == []
+
+
+def test_deep_rep_is_still_counted():
+    tracker = ml.ExerciseTracker()
+    for index, angle in enumerate([170, 140, 100, 95, 100, 140, 170, 170]):
+        ml.analyze_landmarks(squat_frame(angle), "squat", tracker, index * FRAME_SPACING)
+    assert tracker.good_reps == 1
+
+
+def test_rescoring_the_smoothed_frames_matches_the_live_count():
+    angles = [170, 140, 100, 95, 120, 170, 150, 105, 98, 140, 170, 170]
+    rng = np.random.default_rng(0)
+    tracker, recorded = ml.ExerciseTracker(), []
+    for index, angle in enumerate(angles):
+        frame = squat_frame(angle)
+        frame[:, :2] += rng.normal(0.0, 0.004, size=(33, 2))
+        ml.analyze_landmarks(frame, "squat", tracker, index * FRAME_SPACING)
+        recorded.append(tracker.temporal.points)
+
+    scorer = RepScorer(ml.EXERCISES["squat"], ml.ExerciseTracker())
+    scorer.feed(np.arange(len(angles)) * FRAME_SPACING, np.stack(recorded))
+    summary = scorer.summary()
+    assert tracker.good_reps + tracker.bad_reps == 2
+    assert (summary["good_reps"], summary["bad_reps"]) == (tracker.good_reps, tracker.bad_reps)
@@ -0,0 +1,198 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# --- Offline Video Configuration ---
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", str(os.cpu_count() or 1)))
+VIDEO_ANALYSIS_FPS = float(os.getenv("VIDEO_ANALYSIS_FPS", "15"))  # frames per second actually run through the model
+SEGMENT_SECONDS = float(os.getenv("VIDEO_SEGMENT_SECONDS", "10"))
+
+
+def probe_video(path):
+    """Returns (frame_count, fps) for a video file."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video '{path}'")
+    try:
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    finally:
+        cap.release()
+    if frame_count <= 0:
+        raise ValueError(f"Video '{path}' has no frames")
+    return frame_count, fps
+
+
+def _init_worker():
+    # Each worker is one unit of parallelism; keep OpenCV single-threaded inside it.
+    cv2.setNumThreads(1)
+
+
+def analyze_segment(path, start, stop, stride, fps):
+    """Decodes frames [start, stop) of a video and returns (timestamps, landmarks).
+
+    Every ``stride``-th frame is decoded and run through a fresh tracking-mode
+    Pose graph; the others are only grabbed. Frames with nobody in them get a
+    row of NaNs so the timeline stays aligned.
+    """
+    from ml import create_pose, landmarks_to_array
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    timestamps, points = [], []
+    missing = np.full((33, 4), np.nan, dtype=np.float32)
+    with create_pose() as pose:
+        for index in range(start, stop):
+            if (index - start) % stride:
+                if not cap.grab():
+                    break
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+            pose_landmarks = pose.process(frame).pose_landmarks
+            timestamps.append(index / fps)
+            points.append(landmarks_to_array(pose_landmarks) if pose_landmarks is not None else missing)
+    cap.release()
+    if not points:
+        return np.empty(0, dtype=np.float64), np.empty((0, 33, 4), dtype=np.float32)
+    return np.array(timestamps, dtype=np.float64), np.stack(points)
+
+
+def iter_video_landmarks(path, workers=VIDEO_WORKERS, analysis_fps=VIDEO_ANALYSIS_FPS, segment_seconds=SEGMENT_SECONDS):
+    """Yields (timestamps, landmarks) chunks for a whole video, in order.
+
+    Segments are fanned out over a process pool, but only a small window of
+    them is in flight at once, so memory stays bounded however long the
+    video is.
+    """
+    frame_count, fps = probe_video(path)
+    stride = max(1, round(fps / analysis_fps)) if analysis_fps else 1
+    segment_frames = max(stride, int(segment_seconds * fps) // stride * stride)
+    bounds = [(start, min(start + segment_frames, frame_count)) for start in range(0, frame_count, segment_frames)]
+    workers = max(1, min(workers, len(bounds)))
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as executor:
+        pending = collections.deque()
+        segments = iter(bounds)
+
+        def submit_next():
+            bound = next(segments, None)
+            if bound is not None:
+                pending.append(executor.submit(analyze_segment, path, bound[0], bound[1], stride, fps))
+
+        for _ in range(workers * 2):
+            submit_next()
+        while pending:
+            chunk = pending.popleft().result()
+            submit_next()
+            yield chunk
+
+
+def analyze_video(path, exercise_type, workers=VIDEO_WORKERS, analysis_fps=VIDEO_ANALYSIS_FPS):
+    """Scores a recorded workout and returns rep counts plus per-rep timestamps."""
+    from ml import EXERCISES, ExerciseTracker
+    from exercises import RepScorer
+
+    exercise = EXERCISES.get(exercise_type)
+    if exercise is None:
+        raise ValueError(f"'{exercise_type}' is not implemented.")
+
+    started = time.perf_counter()
+    scorer = RepScorer(exercise, ExerciseTracker())
+    duration = 0.0
+    for timestamps, points in iter_video_landmarks(path, workers, analysis_fps):
+        scorer.feed(timestamps, points)
+        if len(timestamps):
+            duration = float(timestamps[-1])
+
+    result = scorer.summary()
+    result["duration_seconds"] = round(duration, 2)
+    result["processing_seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+class VideoJobQueue:
+    """Runs uploaded-video analyses in the background, one at a time.
+
+    Each job fans out over its own process pool, so running them serially
+    keeps the box from being oversubscribed. Only the most recent
+    ``max_jobs`` results are kept.
+    """
+
+    def __init__(self, max_jobs=100):
+        self.max_jobs = max_jobs
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-job")
+
+    def submit(self, owner, path, exercise_type):
+        """Queues a video for analysis; the file is deleted once the job finishes."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"owner": owner, "status": "queued", "exercise": exercise_type}
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job_id, path, exercise_type)
+        return job_id
+
+    def get(self, owner, job_id):
+        """Returns a job's status and result, or None if it is unknown or not the owner's."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["owner"] != owner:
+                return None
+            return {key: value for key, value in job.items() if key != "owner"}
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, path, exercise_type):
+        self._update(job_id, status="running")
+        try:
+            self._update(job_id, status="done", result=analyze_video(path, exercise_type))
+        except ValueError as e:
+            self._update(job_id, status="failed", error=str(e))
+        except Exception as e:
+            print(f"❌ Error analyzing video {job_id}: {e}")
+            self._update(job_id, status="failed", error="Failed to analyze video")
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a recorded workout video offline.")
+    parser.add_argument("video", help="path to the video file")
+    parser.add_argument("--exercise", required=True, help="exercise type, e.g. squat")
+    parser.add_argument("--workers", type=int, default=VIDEO_WORKERS, help="pose worker processes")
+    parser.add_argument("--fps", type=float, default=VIDEO_ANALYSIS_FPS, help="frames per second to analyze (0 = every frame)")
+    parser.add_argument("--output", help="write the JSON result to this file instead of stdout")
+    args = parser.parse_args()
+
+    result = analyze_video(args.video, args.exercise, args.workers, args.fps)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()